@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "core",
     "rest_framework",
     "rest_framework.authtoken",
@@ -134,11 +135,25 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = "/static/static/"
-MEDIA_URL = "/static/media/"
+# Media is served by the authenticated `media` endpoint
+MEDIA_URL = "/api/media/"
 
 STATIC_ROOT = "/vol/web/static"
 MEDIA_ROOT = "/vol/web/media"
 
+# Internal nginx location serving MEDIA_ROOT for media responses through
+# X-Accel-Redirect, empty to send files from Django (development server)
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_PREFIX',
+    '/protected-media/',
+)
+
+# Uploaded files get a `sha256` digest computed as they are received
+FILE_UPLOAD_HANDLERS = [
+    'common.uploads.HashingMemoryFileUploadHandler',
+    'common.uploads.HashingTemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -146,10 +161,135 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "core.User"
 
+# JSON library of API requests and responses, `orjson` falls back to the
+# stdlib `json` when orjson is not installed
+JSON_BACKENDS = {
+    'json': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.parsers.JSONParser',
+    ),
+    'orjson': (
+        'common.renderers.FastJSONRenderer',
+        'common.parsers.FastJSONParser',
+    ),
+}
+JSON_RENDERER, JSON_PARSER = JSON_BACKENDS[
+    os.environ.get('JSON_BACKEND', 'orjson')
+]
+
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        JSON_RENDERER,
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        JSON_PARSER,
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Recipe list pagination
+RECIPE_PAGE_SIZE = int(os.environ.get('RECIPE_PAGE_SIZE', 50))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 500))
+# Recipes read per server-side cursor fetch when streaming CSV lists
+RECIPE_STREAM_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_STREAM_CHUNK_SIZE', 500)
+)
+
+# Resized variants of recipe images, in pixels of the longest side, file
+# formats (jpeg, webp) and encoding quality
+RECIPE_IMAGE_VARIANT_SIZES = [
+    int(size) for size in
+    os.environ.get('RECIPE_IMAGE_VARIANT_SIZES', '128,512,1024').split(',')
+]
+RECIPE_IMAGE_VARIANT_FORMATS = os.environ.get(
+    'RECIPE_IMAGE_VARIANT_FORMATS',
+    'webp,jpeg',
+).split(',')
+RECIPE_IMAGE_VARIANT_QUALITY = int(
+    os.environ.get('RECIPE_IMAGE_VARIANT_QUALITY', 80)
+)
+
+# Recipe image uploads are processed `sync` in the request, or `async` by
+# `manage.py process_images` workers from uploads spooled to a directory
+# shared with them. Claimed jobs are retried after the job timeout.
+RECIPE_IMAGE_PROCESSING = os.environ.get('RECIPE_IMAGE_PROCESSING', 'sync')
+RECIPE_IMAGE_SPOOL_DIR = os.environ.get(
+    'RECIPE_IMAGE_SPOOL_DIR',
+    '/vol/web/spool',
+)
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_JOB_TIMEOUT = int(
+    os.environ.get('RECIPE_IMAGE_JOB_TIMEOUT', 300)
+)
+# Seconds unreferenced image files are kept before garbage collection
+RECIPE_IMAGE_GC_GRACE = int(os.environ.get('RECIPE_IMAGE_GC_GRACE', 86400))
+
+# Maximum number of recipes in one bulk create/update/delete request
+RECIPE_BULK_MAX_SIZE = int(os.environ.get('RECIPE_BULK_MAX_SIZE', 500))
+
+# Caches, the `responses` alias stores per-user API responses and is moved
+# to redis with RESPONSE_CACHE_BACKEND. Versions, locks and counters need
+# the atomic add/incr of a shared backend, which the file backend lacks.
+# The `auth` alias holds token state read by every process, moved to redis
+# with AUTH_CACHE_BACKEND.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')
+AUTH_CACHE_BACKEND = os.environ.get('AUTH_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': CACHE_BACKENDS[RESPONSE_CACHE_BACKEND],
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'responses'),
+    },
+    'auth': {
+        'BACKEND': CACHE_BACKENDS[AUTH_CACHE_BACKEND],
+        'LOCATION': os.environ.get('AUTH_CACHE_LOCATION', 'auth'),
+    },
+}
+
+# Responses are only cached in a backend shared by every web and worker
+# process, a process-local cache keeps serving entries invalidated by writes
+# of other processes. Set to 1 to cache in locmem anyway, e.g. behind the
+# single process development server.
+RESPONSE_CACHE_ENABLED = bool(int(os.environ.get(
+    'RESPONSE_CACHE_ENABLED',
+    int(RESPONSE_CACHE_BACKEND != 'locmem'),
+)))
+
+# Seconds a cached response is fresh, then served stale while a single
+# request per cache rebuilds it
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_STALE_TIMEOUT = int(
+    os.environ.get('RESPONSE_CACHE_STALE_TIMEOUT', 60)
+)
+# Seconds a rebuild lock is held at most, and other requests wait for the
+# rebuilt response when there is no copy to serve meanwhile
+RESPONSE_CACHE_LOCK_TIMEOUT = int(
+    os.environ.get('RESPONSE_CACHE_LOCK_TIMEOUT', 10)
+)
+RESPONSE_CACHE_LOCK_WAIT = float(
+    os.environ.get('RESPONSE_CACHE_LOCK_WAIT', 2)
+)
+
+# In-process cache of API tokens, maximum entries and seconds to keep them.
+# Entries are checked against a per-user generation in the `auth` cache.
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 1024))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+
+# Seconds signed access tokens are valid, and seconds the token state of a
+# user is cached in the `auth` cache to verify them
+ACCESS_TOKEN_LIFETIME = int(os.environ.get('ACCESS_TOKEN_LIFETIME', 300))
+AUTH_STATE_CACHE_TIMEOUT = int(os.environ.get('AUTH_STATE_CACHE_TIMEOUT', 60))
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
 }
@@ -19,10 +19,12 @@ from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView
 )
-from django.conf.urls.static import static
-from django.conf import settings
 from common.constant import API_ENDPOINTS
-from core.views import health_check
+from core.views import (
+    cache_stats,
+    health_check,
+)
+from recipe.views import recipe_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -31,6 +33,16 @@ urlpatterns = [
         health_check,
         name='health-check',
     ),
+    path(
+        'api/' + API_ENDPOINTS['cache-stats'],
+        cache_stats,
+        name='cache-stats',
+    ),
+    path(
+        'api/' + API_ENDPOINTS['media'] + '<path:name>',
+        recipe_media,
+        name='media',
+    ),
     path(
         'api/' + API_ENDPOINTS['schema'],
         SpectacularAPIView.as_view(),
@@ -58,10 +70,3 @@ urlpatterns = [
         include('ingredient.urls'),
     ),
 ]
-
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
@@ -0,0 +1,271 @@
+"""
+Authentication classes shared between apps
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.db import (
+    router,
+    transaction,
+)
+from django.utils.translation import gettext as _
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.exceptions import AuthenticationFailed
+
+ACCESS_TOKEN_SALT = 'common.authentication.access-token'
+# Cache alias shared by every process holding token state
+AUTH_CACHE_ALIAS = 'auth'
+
+
+def get_auth_cache():
+    """ Return the cache backend shared by processes for token state """
+    return caches[AUTH_CACHE_ALIAS]
+
+
+def _generation_key(user_id):
+    """ Return the cache key of the token cache generation of a user """
+    return f'auth-token-cache:generation:{user_id}'
+
+
+class TokenUserCache:
+    """
+    Bounded in-process LRU cache of token key to (user, token).
+
+    Entries record the generation of their user in the shared `auth` cache
+    and are dropped once it changes, so signals in any process evict them
+    everywhere. Entries also expire after `AUTH_TOKEN_CACHE_TIMEOUT`
+    seconds.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_generation(self, user_id):
+        """ Return the current token cache generation of a user """
+        cache = get_auth_cache()
+        key = _generation_key(user_id)
+        generation = cache.get(key)
+        if generation is None:
+            # Start from the clock so a generation evicted from the cache
+            # never comes back with a value recorded by entries
+            cache.add(key, time.time_ns(), None)
+            generation = cache.get(key)
+
+        return generation
+
+    def bump_generation(self, user_id):
+        """ Make entries of a user outdated in every process """
+        cache = get_auth_cache()
+        try:
+            cache.incr(_generation_key(user_id))
+        except ValueError:
+            cache.add(_generation_key(user_id), time.time_ns(), None)
+
+    def get(self, key):
+        """
+        Return the cached user and token of a key, if not expired nor
+        outdated
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            user, token, generation, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        if generation != self.get_generation(user.id):
+            self.evict(key)
+            return None
+
+        return user, token
+
+    def set(self, key, user, token):
+        """ Cache the user and token of a key, evicting the oldest entries """
+        generation = self.get_generation(user.id)
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TIMEOUT
+        with self._lock:
+            self._entries[key] = (user, token, generation, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        """ Remove the entry of a token key in this process """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict_user(self, user_id):
+        """
+        Remove entries of every token of a user in every process, now and
+        when the current transaction commits, so entries loaded from rows
+        read before the commit are outdated too
+        """
+        with self._lock:
+            for key in [
+                key for key, (user, *_) in self._entries.items()
+                if user.id == user_id
+            ]:
+                del self._entries[key]
+
+        self.bump_generation(user_id)
+        transaction.on_commit(lambda: self.bump_generation(user_id))
+
+    def clear(self):
+        """ Remove every entry """
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenUserCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ Token authentication resolving known tokens without a query """
+
+    def authenticate_credentials(self, key):
+        """ Return the user and token of a key, from the cache if possible """
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+            cached = (user, token)
+
+        user, token = cached
+        # Requests may change their user, never share the cached instance
+        return copy.copy(user), token
+
+
+def _user_state_key(user_id):
+    """ Return the cache key of the token state of a user """
+    return f'auth-token-state:{user_id}'
+
+
+def cache_user_state(user):
+    """ Cache the token generation and active flag of a user """
+    get_auth_cache().set(
+        _user_state_key(user.id),
+        (user.token_generation, user.is_active),
+        settings.AUTH_STATE_CACHE_TIMEOUT,
+    )
+
+
+def forget_user_state(user_id):
+    """ Remove the cached token state of a user """
+    get_auth_cache().delete(_user_state_key(user_id))
+
+
+def get_user_state(user_id):
+    """
+    Return the token generation and active flag of a user, read from the
+    database only when not cached, or None for an unknown user.
+    """
+    state = get_auth_cache().get(_user_state_key(user_id))
+    if state is None:
+        user = get_user_model().objects.filter(id=user_id).only(
+            'token_generation',
+            'is_active',
+        ).first()
+        if user is None:
+            return None
+        cache_user_state(user)
+        state = (user.token_generation, user.is_active)
+
+    return state
+
+
+def create_access_token(user):
+    """ Return a signed access token of a user """
+    return signing.dumps(
+        {'uid': user.id, 'gen': user.token_generation},
+        salt=ACCESS_TOKEN_SALT,
+    )
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authentication with expiring signed access tokens.
+
+    Tokens carry the user id and token generation, so verifying them only
+    needs the cached user state. The returned user has every other field
+    deferred and loaded on access.
+
+    Clients authenticate by passing the token in the "Authorization" HTTP
+    header, prepended with the string "Bearer ".
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        """ Return the user and token of a bearer token header, if any """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            msg = _('Invalid token header.')
+            raise AuthenticationFailed(msg)
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            msg = _('Invalid token header.')
+            raise AuthenticationFailed(msg)
+
+        return self.authenticate_credentials(token)
+
+    def authenticate_credentials(self, token):
+        """ Verify a signed access token, return its user and token """
+        try:
+            payload = signing.loads(
+                token,
+                salt=ACCESS_TOKEN_SALT,
+                max_age=settings.ACCESS_TOKEN_LIFETIME,
+            )
+        except signing.SignatureExpired:
+            raise AuthenticationFailed(_('Token expired.'))
+        except signing.BadSignature:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        state = get_user_state(payload['uid'])
+        if state is None or not state[1]:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        if state[0] != payload['gen']:
+            raise AuthenticationFailed(_('Token revoked.'))
+
+        model = get_user_model()
+        user = model.from_db(
+            router.db_for_read(model),
+            ['id', 'is_active', 'token_generation'],
+            [payload['uid'], True, payload['gen']],
+        )
+
+        return user, token
+
+    def authenticate_header(self, request):
+        """ Return the WWW-Authenticate header of 401 responses """
+        return self.keyword
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """ OpenAPI security scheme of signed access tokens """
+    target_class = SignedTokenAuthentication
+    name = 'signedTokenAuth'
+
+    def get_security_definition(self, auto_schema):
+        """ Describe bearer token authentication """
+        return {'type': 'http', 'scheme': 'bearer'}
@@ -0,0 +1,185 @@
+"""
+Per-user versioned cache of API responses.
+
+Every user has a data version stored in the `responses` cache. Cached
+responses record the version they were computed for, so bumping it on any
+write makes all of the user's entries outdated without scanning or
+deleting them.
+
+Rebuilds are single-flight: the first request finding a missing, expired
+or outdated entry takes a short lock and recomputes it, while concurrent
+requests serve the expired copy of the same version or wait for the
+rebuilt one.
+
+Versions, locks and counters rely on atomic `add` and `incr` of a backend
+shared by every process, i.e. redis. Under locmem, single-flight and
+invalidation only hold within one process.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'responses'
+HITS_KEY = 'response-cache:hits'
+MISSES_KEY = 'response-cache:misses'
+STALE_KEY = 'response-cache:stale'
+# Seconds between lookups while waiting for a rebuilt response
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_cache():
+    """ Return the cache backend storing responses """
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    """ Return the cache key of a user data version """
+    return f'response-cache:version:{user_id}'
+
+
+def get_user_version(user_id):
+    """ Return the current data version of a user """
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version evicted from the cache never
+        # comes back with a value used by entries still stored
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_user_version(user_id):
+    """ Make every cached response of a user unreachable """
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+
+
+def invalidate_user(user_id):
+    """
+    Invalidate cached responses of a user now and when the current
+    transaction commits, so responses computed from data read before the
+    commit are not cached under the new version.
+    """
+    bump_user_version(user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+def response_cache_key(user_id, *parts):
+    """ Return the cache key of a response of a user """
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'response-cache:{user_id}:{digest}'
+
+
+def get_response(key):
+    """ Return the cached entry of a response, if any """
+    return get_cache().get(key)
+
+
+def is_fresh(entry, version):
+    """ Check whether an entry is up to date and not expired """
+    return (
+        entry is not None and
+        entry['version'] == version and
+        entry['expires'] > time.time()
+    )
+
+
+def is_stale(entry, version):
+    """ Check whether an entry is up to date but expired """
+    return entry is not None and entry['version'] == version
+
+
+def set_response(key, version, content, content_type):
+    """ Cache a response computed for a user data version """
+    entry = {
+        'version': version,
+        'expires': time.time() + settings.RESPONSE_CACHE_TIMEOUT,
+        'content': content,
+        'content_type': content_type,
+    }
+    # Keep the entry past its expiry so it can be served while rebuilt
+    timeout = (
+        settings.RESPONSE_CACHE_TIMEOUT +
+        settings.RESPONSE_CACHE_STALE_TIMEOUT
+    )
+    get_cache().set(key, entry, timeout)
+
+
+def _lock_key(key):
+    """ Return the cache key of the rebuild lock of a response """
+    return f'{key}:lock'
+
+
+def acquire_lock(key):
+    """ Take the rebuild lock of a response, return whether it was taken """
+    return get_cache().add(
+        _lock_key(key),
+        1,
+        settings.RESPONSE_CACHE_LOCK_TIMEOUT,
+    )
+
+
+def release_lock(key):
+    """ Release the rebuild lock of a response """
+    get_cache().delete(_lock_key(key))
+
+
+def wait_for_response(key, version):
+    """
+    Wait for another request to rebuild a response, return the fresh entry
+    or None when the lock is released or the wait times out without it.
+    """
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = get_response(key)
+        if is_fresh(entry, version):
+            return entry
+        if get_cache().get(_lock_key(key)) is None:
+            break
+
+    return None
+
+
+def _count(key):
+    """ Increment a counter stored in the cache """
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def record_hit():
+    """ Count a response served from the cache """
+    _count(HITS_KEY)
+
+
+def record_miss():
+    """ Count a response computed because it was not cached """
+    _count(MISSES_KEY)
+
+
+def record_stale():
+    """ Count an expired response served while it is rebuilt """
+    _count(STALE_KEY)
+
+
+def get_stats():
+    """ Return hit, miss and stale counters of the response cache """
+    counters = get_cache().get_many([HITS_KEY, MISSES_KEY, STALE_KEY])
+
+    return {
+        'hits': counters.get(HITS_KEY, 0),
+        'misses': counters.get(MISSES_KEY, 0),
+        'stale': counters.get(STALE_KEY, 0),
+    }
@@ -2,10 +2,13 @@ API_ENDPOINTS = {
     'schema': 'schema/',
     'docs': 'docs/',
     'health-check': 'health-check/',
+    'cache-stats': 'cache-stats/',
+    'media': 'media/',
     'user': {
         'base': 'users/',
         'create': 'create/',
         'token': 'token/',
+        'token-refresh': 'token/refresh/',
         'me': 'me/',
     },
     'recipe': {
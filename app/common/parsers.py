@@ -0,0 +1,31 @@
+"""
+Parsers shared between apps
+"""
+import codecs
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSON parser using orjson, falling back to the stdlib `json` parser when
+    orjson is not installed or the request is not UTF-8 encoded.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """ Parse a UTF-8 JSON request body """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,192 @@
+"""
+Renderers shared between apps
+"""
+import csv
+import json
+from rest_framework.renderers import (
+    BaseRenderer,
+    JSONRenderer,
+)
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer using orjson, falling back to the stdlib `json` renderer
+    when orjson is not installed or an indented output is requested.
+
+    Values orjson does not encode natively (Decimal, lazy strings, ...) and
+    datetimes go through DRF's encoder, so the output matches JSONRenderer.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """ Render data into compact UTF-8 JSON """
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None or
+            self.get_indent(accepted_media_type, renderer_context)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        return orjson.dumps(
+            data,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+
+
+class JSONLinesRenderer(FastJSONRenderer):
+    """
+    Renderer of a list of objects, or a single object, as JSON Lines.
+
+    `stream()` renders lines lazily for `StreamingHttpResponse`.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+    def stream(self, items):
+        """ Yield encoded JSON lines of objects """
+        for item in items:
+            yield super().render(item) + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """ Render objects into JSON Lines """
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+
+        return b''.join(self.stream(data))
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renderer of MessagePack binary data.
+
+    Values are the same as in JSON responses: Decimals, datetimes and other
+    values without a MessagePack type go through DRF's JSON encoder.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """ Render data into MessagePack """
+        if data is None:
+            return b''
+
+        return msgpack.packb(data, default=self.encoder.default)
+
+
+class _Echo:
+    """ File-like object returning what is written to it """
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Renderer of a list of objects, or a single object, as CSV rows.
+
+    The first row holds the field names. Nested lists are flattened into a
+    single column joining the `name` of each object (or the item itself)
+    with `|`; backslashes and `|` in names are escaped with a backslash.
+    Nested objects are rendered as JSON, nulls as empty cells.
+
+    `stream()` renders rows lazily for `StreamingHttpResponse`.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    separator = '|'
+
+    def _flatten_item(self, item):
+        """ Return the escaped text of a nested list item """
+        if isinstance(item, dict):
+            item = item.get('name', '')
+
+        return str(item).replace('\\', '\\\\').replace(
+            self.separator,
+            '\\' + self.separator,
+        )
+
+    def flatten(self, value):
+        """ Return the cell value of a field """
+        if value is None:
+            return ''
+        if isinstance(value, dict):
+            return json.dumps(value)
+        if isinstance(value, (list, tuple)):
+            return self.separator.join(
+                self._flatten_item(item) for item in value
+            )
+
+        return value
+
+    def unflatten(self, value):
+        """ Return the list of names of a flattened nested list cell """
+        if not value:
+            return []
+
+        names = []
+        name = []
+        characters = iter(value)
+        for character in characters:
+            if character == '\\':
+                name.append(next(characters, ''))
+            elif character == self.separator:
+                names.append(''.join(name))
+                name = []
+            else:
+                name.append(character)
+        names.append(''.join(name))
+
+        return names
+
+    def stream(self, items, header=None):
+        """ Yield encoded CSV lines of objects, header first """
+        writer = csv.writer(_Echo())
+        items = iter(items)
+        if header is None:
+            first = next(items, None)
+            if first is None:
+                return
+            header = list(first)
+            items = (item for batch in ([first], items) for item in batch)
+
+        yield writer.writerow(header).encode(self.charset)
+        for item in items:
+            row = [self.flatten(item.get(name)) for name in header]
+            yield writer.writerow(row).encode(self.charset)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """ Render objects into CSV """
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+
+        return b''.join(self.stream(data))
+
+
+# Renderers of batch data formats whose library is installed
+BATCH_RENDERER_CLASSES = [CSVRenderer]
+if msgpack is not None:
+    BATCH_RENDERER_CLASSES.append(MessagePackRenderer)
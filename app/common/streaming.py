@@ -0,0 +1,42 @@
+"""
+Helpers for streamed responses and files
+"""
+import zlib
+from itertools import islice
+
+# Bytes gathered before a block is sent to the client or compressor
+BLOCK_SIZE = 64 * 1024
+
+
+def chunked(iterable, size):
+    """ Yield lists of at most `size` items of an iterable """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def buffered(blocks, size=BLOCK_SIZE):
+    """ Join small byte strings into blocks of at least `size` bytes """
+    buffer = []
+    length = 0
+    for block in blocks:
+        buffer.append(block)
+        length += len(block)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(blocks, level=6):
+    """ Compress byte strings into a gzip stream on the fly """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+
+    yield compressor.flush()
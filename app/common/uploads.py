@@ -0,0 +1,49 @@
+"""
+Upload handlers hashing uploaded files while they are received
+"""
+import hashlib
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class HashingUploadHandlerMixin:
+    """
+    Compute the SHA-256 digest of the chunks stored by the handler and set
+    it as the `sha256` attribute of the uploaded file
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Set first, the memory handler stops other handlers by raising
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        # Chunks returned are passed on to, and stored by, the next handler
+        if remaining is None:
+            self.hasher.update(raw_data)
+
+        return remaining
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.hasher.hexdigest()
+
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin,
+    MemoryFileUploadHandler,
+):
+    """ Memory upload handler hashing uploaded files """
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin,
+    TemporaryFileUploadHandler,
+):
+    """ Temporary file upload handler hashing uploaded files """
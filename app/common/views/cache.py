@@ -0,0 +1,124 @@
+from urllib.parse import urlencode
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.response import Response
+from common import cache
+from common.views.early_response import (
+    EarlyResponse,
+    EarlyResponseMixin,
+)
+
+
+class CachedResponseMixin(EarlyResponseMixin):
+    """
+    Mixin serving GET responses of `cached_actions` from the cache.
+
+    Entries are keyed by user, the host, the path, the normalized query
+    string and the negotiated media type, and record the user data version
+    read before the action runs, so a write racing with the request makes
+    the entry outdated. Only the request holding the rebuild lock
+    recomputes a missing or expired entry; others serve the expired copy
+    or wait for the rebuilt one. Nothing is cached unless
+    `RESPONSE_CACHE_ENABLED`.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_response_cache_key(self):
+        """ Return the cache key of the requested response """
+        request = self.request
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+
+        return cache.response_cache_key(
+            request.user.id,
+            request.get_host(),
+            request.path,
+            query,
+            request.accepted_renderer.media_type,
+        )
+
+    def _cached_response(self, entry, status):
+        """ Return an early response carrying a cached entry """
+        response = HttpResponse(
+            entry['content'],
+            content_type=entry['content_type'],
+        )
+        response['X-Cache'] = status
+
+        return EarlyResponse(response)
+
+    def initial(self, request, *args, **kwargs):
+        """ Answer from the cache before running the action """
+        super().initial(request, *args, **kwargs)
+
+        self.response_cache_key = None
+        self.response_cache_locked = False
+        if (
+            not settings.RESPONSE_CACHE_ENABLED or
+            request.method != 'GET' or
+            self.action not in self.cached_actions
+        ):
+            return
+
+        key = self.get_response_cache_key()
+        version = cache.get_user_version(request.user.id)
+        entry = cache.get_response(key)
+        if cache.is_fresh(entry, version):
+            cache.record_hit()
+            raise self._cached_response(entry, 'HIT')
+
+        self.response_cache_key = key
+        self.response_cache_version = version
+        if cache.acquire_lock(key):
+            self.response_cache_locked = True
+            cache.record_miss()
+            return
+
+        # Another request is rebuilding the response
+        if cache.is_stale(entry, version):
+            cache.record_stale()
+            raise self._cached_response(entry, 'STALE')
+
+        entry = cache.wait_for_response(key, version)
+        if entry is not None:
+            cache.record_hit()
+            raise self._cached_response(entry, 'HIT')
+
+        cache.record_miss()
+
+    def _store_response(self, response):
+        """ Cache a rendered response and release the rebuild lock """
+        try:
+            cache.set_response(
+                self.response_cache_key,
+                self.response_cache_version,
+                response.content,
+                response['Content-Type'],
+            )
+        finally:
+            self._release_lock()
+
+    def _release_lock(self):
+        """ Release the rebuild lock if this request holds it """
+        if self.response_cache_locked:
+            self.response_cache_locked = False
+            cache.release_lock(self.response_cache_key)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """ Store successful responses once rendered """
+        response = super().finalize_response(
+            request,
+            response,
+            *args,
+            **kwargs,
+        )
+
+        if not getattr(self, 'response_cache_key', None):
+            return response
+
+        if isinstance(response, Response) and response.status_code == 200:
+            response['X-Cache'] = 'MISS'
+            response.add_post_render_callback(self._store_response)
+        else:
+            self._release_lock()
+
+        return response
@@ -0,0 +1,105 @@
+import hashlib
+from django.db.models import (
+    Count,
+    Max,
+)
+from django.utils.cache import (
+    get_conditional_response,
+    quote_etag,
+)
+from django.utils.http import http_date
+from common.views.early_response import (
+    EarlyResponse,
+    EarlyResponseMixin,
+)
+
+
+class ConditionalGetMixin(EarlyResponseMixin):
+    """
+    Mixin answering unchanged list/retrieve requests with 304.
+
+    Validators come from `MAX(updated_at)` and `COUNT(*)` aggregates over
+    `get_validator_querysets()`, so a 304 is returned without loading or
+    serializing any row. `Last-Modified` is only sent for actions in
+    `last_modified_actions`: a list can shrink on delete without its
+    `MAX(updated_at)` moving, which the ETag row count does catch.
+    """
+    conditional_actions = ('list', 'retrieve')
+    last_modified_actions = ('retrieve',)
+
+    def get_validator_querysets(self):
+        """ Return querysets whose rows make up the response """
+        raise NotImplementedError
+
+    def get_validators(self):
+        """ Return the ETag and Last-Modified timestamp of the response """
+        try:
+            aggregates = [
+                queryset.aggregate(
+                    last_modified=Max('updated_at'),
+                    total=Count('id'),
+                )
+                for queryset in self.get_validator_querysets()
+            ]
+        except ValueError:
+            # Malformed lookup from the URL, let the action answer it
+            return None, None
+
+        parts = [self.request.accepted_renderer.media_type]
+        parts += [
+            f"{aggregate['last_modified']}/{aggregate['total']}"
+            for aggregate in aggregates
+        ]
+        etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+        last_modified = None
+        dates = [
+            aggregate['last_modified'] for aggregate in aggregates
+            if aggregate['last_modified'] is not None
+        ]
+        if self.action in self.last_modified_actions and dates:
+            last_modified = int(max(dates).timestamp())
+
+        return etag, last_modified
+
+    def initial(self, request, *args, **kwargs):
+        """ Answer before running the action if the client copy is fresh """
+        super().initial(request, *args, **kwargs)
+
+        self.conditional_validators = None
+        if (
+            request.method not in ('GET', 'HEAD') or
+            self.action not in self.conditional_actions
+        ):
+            return
+
+        etag, last_modified = self.get_validators()
+        if etag is None:
+            return
+
+        self.conditional_validators = (etag, last_modified)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is not None:
+            raise EarlyResponse(response)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """ Add the validators to responses """
+        response = super().finalize_response(
+            request,
+            response,
+            *args,
+            **kwargs,
+        )
+
+        validators = getattr(self, 'conditional_validators', None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+
+        return response
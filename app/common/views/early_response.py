@@ -0,0 +1,17 @@
+class EarlyResponse(Exception):
+    """ Raised from `initial()` to answer a request without its action """
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class EarlyResponseMixin:
+    """ Mixin returning responses carried by `EarlyResponse` """
+
+    def handle_exception(self, exc):
+        """ Return early responses, handle other exceptions as usual """
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+
+        return super().handle_exception(exc)
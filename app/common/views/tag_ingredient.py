@@ -1,9 +1,29 @@
+from django.db import (
+    transaction,
+    IntegrityError,
+)
+from django.db.models import (
+    Count,
+    Q,
+)
+from django.db.models.functions import Upper
+from django.contrib.postgres.search import TrigramSimilarity
+from django.utils.translation import gettext as _
 from rest_framework import (
     mixins,
     viewsets,
 )
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from core.models import Recipe
+from common.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from common.views.cache import CachedResponseMixin
+from common.views.conditional import ConditionalGetMixin
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -23,26 +43,124 @@ from drf_spectacular.utils import (
             ),
         ],
     ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='Term to complete, matched as a name prefix '
+                            'first, then anywhere in the name',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Maximum number of suggestions',
+            ),
+        ],
+    ),
 )
 class BaseAuthenticatedTagAndIngredientViewSet(
+    CachedResponseMixin,
+    ConditionalGetMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
 ):
     """ Base authenticated viewset for tags and ingredients """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        SignedTokenAuthentication,
+        CachedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+
+    def _is_assigned_only(self):
+        """ Check whether only items assigned to recipes are requested """
+        return bool(int(self.request.query_params.get('assigned_only', 0)))
 
     def get_queryset(self):
         """ Retrieve items for authenticated user """
         queryset = self.queryset
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
+        assigned_only = self._is_assigned_only()
         if assigned_only:
             queryset = queryset.filter(recipe__isnull=False)
 
         return queryset.filter(
             user=self.request.user
         ).order_by('-name').distinct()
+
+    def get_validator_querysets(self):
+        """ Return rows whose changes alter item responses """
+        user = self.request.user
+        if self.action == 'retrieve':
+            return [self.queryset.filter(user=user, id=self.kwargs['pk'])]
+
+        querysets = [self.queryset.filter(user=user)]
+        if self._is_assigned_only():
+            querysets.append(Recipe.objects.filter(user=user))
+
+        return querysets
+
+    def perform_update(self, serializer):
+        """ Update item, rejecting a name already used by the user """
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            msg = _('An item with this name already exists')
+            raise ValidationError({'name': [msg]})
+
+    def _get_autocomplete_limit(self):
+        """ Return the number of suggestions requested by the client """
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return self.autocomplete_limit
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError({'limit': [_('Must be a positive integer')]})
+
+        return min(limit, self.autocomplete_max_limit)
+
+    @action(methods=['GET'], detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        """
+        Suggest items of the authenticated user matching a term.
+
+        Prefix matches come first and are served by the
+        `(user, UPPER(name) text_pattern_ops)` index, ranked by the number
+        of recipes using the item. Remaining slots are filled with items
+        containing the term or similar to it despite typos, served by the
+        `UPPER(name) gin_trgm_ops` index and ranked by trigram similarity.
+        """
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            raise ValidationError({'q': [_('This field is required')]})
+        limit = self._get_autocomplete_limit()
+
+        queryset = self.queryset.filter(user=request.user).annotate(
+            usage=Count('recipe'),
+        ).order_by('-usage', 'name')
+
+        items = list(queryset.filter(name__istartswith=term)[:limit])
+        if len(items) < limit:
+            upper_term = term.upper()
+            matches = queryset.annotate(
+                upper_name=Upper('name'),
+                similarity=TrigramSimilarity(Upper('name'), upper_term),
+            ).filter(
+                Q(name__icontains=term) |
+                Q(upper_name__trigram_similar=upper_term)
+            ).exclude(
+                name__istartswith=term,
+            ).order_by('-similarity', '-usage', 'name')
+            items += list(matches[:limit - len(items)])
+
+        serializer = self.get_serializer(items, many=True)
+        return Response(serializer.data)
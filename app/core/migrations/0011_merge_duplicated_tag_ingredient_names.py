@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:03
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicated_names(apps, schema_editor):
+    """ Merge tags/ingredients sharing a name for the same user """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        field = f'{model_name.lower()}_id'
+
+        duplicates = model.objects.values('user', 'name').annotate(
+            keep_id=Min('id'),
+            total=Count('id'),
+        ).filter(total__gt=1)
+        for duplicate in duplicates:
+            keep_id = duplicate['keep_id']
+            extra = model.objects.filter(
+                user=duplicate['user'],
+                name=duplicate['name'],
+            ).exclude(id=keep_id)
+            linked = set(through.objects.filter(
+                **{field: keep_id},
+            ).values_list('recipe_id', flat=True))
+            to_link = set(through.objects.filter(
+                **{f'{field}__in': extra.values('id')},
+            ).values_list('recipe_id', flat=True)) - linked
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{field: keep_id})
+                for recipe_id in to_link
+            ])
+            extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_user_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicated_names,
+            migrations.RunPython.noop,
+        ),
+    ]
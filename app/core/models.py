@@ -4,12 +4,37 @@ Database models
 import uuid
 import os
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.conf import settings
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import (
+    GinIndex,
+    OpClass,
+)
+from django.contrib.postgres.search import SearchVectorField
+
+# Text search configuration of `Recipe.search_vector`, it must match the
+# one used by the `core_recipe_search_vector` trigger
+RECIPE_SEARCH_CONFIG = 'english'
+
+
+def recipe_image_shard_path(filename):
+    """
+    Return the path of a recipe image file under two levels of directories
+    named by its first four hex digits
+    """
+    return os.path.join(
+        'uploads',
+        'recipe',
+        filename[:2],
+        filename[2:4],
+        filename,
+    )
 
 
 def recipe_image_file_path(instance, filename):
@@ -17,7 +42,12 @@ def recipe_image_file_path(instance, filename):
     ext = os.path.splitext(filename)[1]
     filename = f'{uuid.uuid4()}{ext}'
 
-    return os.path.join('uploads', 'recipe', filename)
+    return recipe_image_shard_path(filename)
+
+
+def recipe_image_content_path(digest, ext):
+    """ Generate file path of a recipe image stored by content hash """
+    return recipe_image_shard_path(f'{digest}{ext.lower()}')
 
 
 class UserManager(BaseUserManager):
@@ -51,10 +81,17 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Signed access tokens issued before the last increment are revoked
+    token_generation = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
     USERNAME_FIELD = "email"
 
+    def set_password(self, raw_password):
+        """ Set the password and revoke signed access tokens """
+        super().set_password(raw_password)
+        self.token_generation += 1
+
 
 class Recipe(models.Model):
     """ Recipe model """
@@ -69,7 +106,46 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
+
+    class ImageStatus(models.TextChoices):
+        """ Processing state of the last uploaded image """
+        READY = 'ready'
+        PROCESSING = 'processing'
+        FAILED = 'failed'
+
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # `<size>.<format>` keys of the generated variants of `image`
+    image_variants = models.JSONField(default=list, editable=False)
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Weighted title/description lexemes, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx',
+            ),
+            # Lookups of recipes by image path
+            models.Index(
+                fields=['image'],
+                name='core_recipe_image_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='core_recipe_search_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -82,6 +158,28 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_tag_unique_user_name',
+            ),
+        ]
+        indexes = [
+            # Case-insensitive prefix search of names per user
+            models.Index(
+                F('user'),
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='core_tag_name_prefix_idx',
+            ),
+            # Typo tolerant search of names anywhere in them
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='core_tag_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -94,6 +192,102 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_ingredient_unique_user_name',
+            ),
+        ]
+        indexes = [
+            # Case-insensitive prefix search of names per user
+            models.Index(
+                F('user'),
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='core_ingr_name_prefix_idx',
+            ),
+            # Typo tolerant search of names anywhere in them
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='core_ingr_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ImageBlobManager(models.Manager):
+    """ Manager counting recipe references to stored images """
+
+    def get_name(self, digest):
+        """ Return the name of the stored image of a digest, or None """
+        return self.filter(digest=digest).values_list(
+            'name',
+            flat=True,
+        ).first()
+
+    def reference(self, digest, name):
+        """
+        Count a reference to the image of a digest, registering it under
+        `name` when new, and return the name of the stored image
+        """
+        # Locked until the transaction ends, against garbage collection
+        blob, created = self.select_for_update().get_or_create(
+            digest=digest,
+            defaults={'name': name, 'references': 1},
+        )
+        if not created:
+            self.filter(id=blob.id).update(references=F('references') + 1)
+
+        return blob.name
+
+    def release(self, name):
+        """ Drop a reference to a stored image """
+        if name:
+            self.filter(name=name, references__gt=0).update(
+                references=F('references') - 1,
+            )
+
+
+class ImageBlob(models.Model):
+    """ Recipe image stored once under the hash of the uploaded bytes """
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=100, unique=True)
+    # Recipes using the image, unreferenced images are garbage collected
+    references = models.PositiveIntegerField(default=0)
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class ImageJob(models.Model):
+    """ Spooled recipe image upload waiting for an image worker """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+    )
+    upload = models.CharField(max_length=255)
+    # SHA-256 of the uploaded bytes
+    digest = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when a worker claims the job, reclaimable after a timeout
+    started_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.upload}'
+
+
+class ImportCheckpoint(models.Model):
+    """ Number of input records a resumable import has committed """
+    name = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.position})'
@@ -0,0 +1,90 @@
+"""
+Signal handlers invalidating caches of changed user data, releasing
+stored images and removing spooled image uploads
+"""
+import os
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from common.authentication import (
+    cache_user_state,
+    forget_user_state,
+    token_cache,
+)
+from common.cache import invalidate_user
+from core.models import (
+    ImageBlob,
+    ImageJob,
+    Ingredient,
+    Recipe,
+    Tag,
+    User,
+)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_owner(sender, instance, **kwargs):
+    """ Invalidate responses of the owner of a saved/deleted object """
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """ Drop the reference of a deleted recipe to its stored image """
+    ImageBlob.objects.release(instance.image.name)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_links(sender, instance, action, **kwargs):
+    """ Invalidate responses of the owner of relinked recipes/objects """
+    if action.startswith('post_'):
+        invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def evict_token(sender, instance, **kwargs):
+    """ Stop authenticating with a deleted token in every process """
+    token_cache.evict(instance.key)
+    token_cache.evict_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def refresh_user_tokens(sender, instance, **kwargs):
+    """
+    Reload tokens of a saved user, so deactivation and password changes
+    apply to the next request
+    """
+    token_cache.evict_user(instance.id)
+    cache_user_state(instance)
+
+
+@receiver(post_delete, sender=User)
+def evict_user_tokens(sender, instance, **kwargs):
+    """ Stop authenticating tokens of a deleted user """
+    token_cache.evict_user(instance.id)
+    forget_user_state(instance.id)
+
+
+def _remove_upload(path):
+    """ Remove a spooled upload, ignoring already removed files """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@receiver(post_delete, sender=ImageJob)
+def remove_spooled_upload(sender, instance, **kwargs):
+    """ Remove the upload of a processed or cancelled image job """
+    transaction.on_commit(lambda: _remove_upload(instance.upload))
@@ -0,0 +1,218 @@
+"""
+Tests for cached and signed token authentication
+"""
+import tempfile
+from unittest.mock import patch
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from common.authentication import (
+    AUTH_CACHE_ALIAS,
+    cache_user_state,
+    create_access_token,
+    token_cache,
+)
+
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """ Tests for cached token authentication """
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_known_token_authenticated_without_query(self):
+        """ Test a cached token authenticates without a query """
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """ Test a deleted token stops authenticating """
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """ Test a deactivated user stops authenticating """
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_in_other_process_rejected(self):
+        """ Test cached tokens are dropped once another process evicts them """
+        self.client.get(ME_URL)
+
+        get_user_model().objects.filter(id=self.user.id).update(
+            is_active=False,
+        )
+        # Signals of the other process only bump the shared generation
+        token_cache.bump_generation(self.user.id)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_reloads_user(self):
+        """ Test changing password evicts the cached user """
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'password': 'new-password'})
+        cached = token_cache.get(self.token.key)
+
+        self.assertIsNone(cached)
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=1)
+    def test_cache_size_bounded(self):
+        """ Test the least recently used token is evicted """
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        other_token = Token.objects.create(user=other)
+        self.client.get(ME_URL)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_token.key}')
+        self.client.get(ME_URL)
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertIsNotNone(token_cache.get(other_token.key))
+
+    def test_cache_entry_expires(self):
+        """ Test expired tokens are authenticated again """
+        self.client.get(ME_URL)
+
+        with patch('common.authentication.time.monotonic', return_value=1e12):
+            self.assertIsNone(token_cache.get(self.token.key))
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    """ Tests for signed access token authentication """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        self.client = APIClient()
+        self.authenticate(create_access_token(self.user))
+
+    def authenticate(self, access):
+        """ Send an access token with the next requests """
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_access_token_verified_without_query(self):
+        """ Test a signed access token authenticates without a query """
+        # Only the conditional GET aggregates and the recipe list run
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_tampered_access_token_rejected(self):
+        """ Test an access token with a changed payload is rejected """
+        payload, timestamp, signature = create_access_token(
+            self.user,
+        ).split(':')
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        forged = create_access_token(other).split(':')[0]
+        self.authenticate(f'{forged}:{timestamp}:{signature}')
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(ACCESS_TOKEN_LIFETIME=-1)
+    def test_expired_access_token_rejected(self):
+        """ Test an expired access token is rejected """
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_revoked_by_password_change(self):
+        """ Test changing password revokes issued access tokens """
+        self.user.set_password('new-password')
+        self.user.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_of_deactivated_user_rejected(self):
+        """ Test deactivating a user rejects its access tokens """
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_revoked_by_other_process(self):
+        """ Test revocations of another process are read from shared state """
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={
+                **settings.CACHES,
+                AUTH_CACHE_ALIAS: {
+                    # Instances share entries but no memory, like redis
+                    'BACKEND': (
+                        'django.core.cache.backends.filebased.FileBasedCache'
+                    ),
+                    'LOCATION': location,
+                },
+            },
+        ):
+            self.client.get(RECIPES_URL)
+
+            get_user_model().objects.filter(id=self.user.id).update(
+                is_active=False,
+            )
+            self.user.is_active = False
+            # Another process holds its own instance of the shared backend
+            other_cache = caches.create_connection(AUTH_CACHE_ALIAS)
+            with patch(
+                'common.authentication.get_auth_cache',
+                return_value=other_cache,
+            ):
+                cache_user_state(self.user)
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_signed_with_other_salt_rejected(self):
+        """ Test values signed for another purpose are not access tokens """
+        self.authenticate(signing.dumps({'uid': self.user.id, 'gen': 1}))
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,52 @@
+"""
+Tests for response cache stats API
+"""
+from django.contrib.auth import get_user_model
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from common.cache import get_stats
+
+CACHE_STATS_URL = reverse('cache-stats')
+TAGS_URL = reverse('tag:tag-list')
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class CacheStatsTest(TestCase):
+    """ Tests for response cache stats API """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+
+    def test_cache_stats_admin_required(self):
+        """ Test cache stats are not available to regular users """
+        self.client.force_authenticate(self.user)
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cache_stats_count_hits_and_misses(self):
+        """ Test cache stats count cached and computed responses """
+        before = get_stats()
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='12345678',
+        )
+        self.client.force_authenticate(admin)
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['hits'], before['hits'] + 1)
+        self.assertEqual(res.data['misses'], before['misses'] + 1)
@@ -124,4 +124,10 @@ class ModelTests(TestCase):
         mock_uuid.return_value = uuid
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
-        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+        self.assertEqual(file_path, f'uploads/recipe/te/st/{uuid}.jpg')
+
+    def test_recipe_image_content_path(self):
+        """ Test content hash image paths are sharded by hex prefix """
+        file_path = models.recipe_image_content_path('ab12cd', '.JPG')
+
+        self.assertEqual(file_path, 'uploads/recipe/ab/12/ab12cd.jpg')
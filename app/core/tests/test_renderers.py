@@ -0,0 +1,82 @@
+"""
+Tests for JSON renderer and parser
+"""
+import io
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from common.parsers import FastJSONParser
+from common.renderers import FastJSONRenderer
+
+DATA = {
+    'price': Decimal('5.50'),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'created': datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+    'message': gettext_lazy('This field is required.'),
+    'errors': {0: ['Recipe not found'], 'title': ['Blank']},
+    'text': 'Cà phê',
+    'empty': None,
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """ Tests for orjson renderer """
+
+    def test_render_matches_json_renderer(self):
+        """ Test rendered JSON is identical to the stdlib renderer """
+        content = FastJSONRenderer().render(DATA)
+
+        self.assertEqual(content, JSONRenderer().render(DATA))
+
+    def test_render_indented_with_json_renderer(self):
+        """ Test indented output falls back to the stdlib renderer """
+        content = FastJSONRenderer().render(
+            DATA,
+            'application/json; indent=4',
+        )
+
+        self.assertEqual(
+            content,
+            JSONRenderer().render(DATA, 'application/json; indent=4'),
+        )
+
+    def test_render_without_orjson(self):
+        """ Test rendering falls back when orjson is not installed """
+        with patch('common.renderers.orjson', None):
+            content = FastJSONRenderer().render(DATA)
+
+        self.assertEqual(content, JSONRenderer().render(DATA))
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """ Tests for orjson parser """
+    body = '{"title": "Cà phê", "price": "5.50", "tags": [{"name": "a"}]}'
+
+    def test_parse_matches_json_parser(self):
+        """ Test parsed data is identical to the stdlib parser """
+        data = FastJSONParser().parse(io.BytesIO(self.body.encode()))
+
+        self.assertEqual(
+            data,
+            JSONParser().parse(io.BytesIO(self.body.encode())),
+        )
+
+    def test_parse_other_encoding(self):
+        """ Test non UTF-8 bodies fall back to the stdlib parser """
+        data = FastJSONParser().parse(
+            io.BytesIO(self.body.encode('latin-1')),
+            parser_context={'encoding': 'latin-1'},
+        )
+
+        self.assertEqual(data['title'], 'Cà phê')
+
+    def test_parse_error(self):
+        """ Test malformed JSON raises a parse error """
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"title": '))
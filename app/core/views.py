@@ -1,11 +1,23 @@
 """
 Core views for app
 """
-from rest_framework.decorators import api_view
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+)
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from common.cache import get_stats
 
 
 @api_view(['GET'])
 def health_check(request):
     """ Returns successful response """
     return Response({'healthy': True})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """ Returns hit and miss counters of the response cache """
+    return Response(get_stats())
@@ -15,6 +15,7 @@ from core.models import (
 from ingredient.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('ingredient:ingredient-list')
+INGREDIENTS_AUTOCOMPLETE_URL = reverse('ingredient:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -184,3 +185,36 @@ class PrivateIngredientApisTest(TestCase):
         res = self.client.get(INGREDIENTS_URL, params)
 
         self.assertEqual(len(res.data), 1)
+
+    def test_autocomplete_ingredients(self):
+        """ Test suggest ingredients by prefix, then by substring """
+        ingredient_1 = Ingredient.objects.create(
+            name='Salt',
+            user=self.user,
+        )
+        ingredient_2 = Ingredient.objects.create(
+            name='Sea salt',
+            user=self.user,
+        )
+        Ingredient.objects.create(name='Pepper', user=self.user)
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'q': 'salt'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [ingredient_1.id, ingredient_2.id],
+        )
+
+    def test_autocomplete_ingredients_typo(self):
+        """ Test suggest ingredients similar to a misspelled term """
+        ingredient = Ingredient.objects.create(
+            name='Zucchini',
+            user=self.user,
+        )
+        Ingredient.objects.create(name='Pepper', user=self.user)
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'q': 'zuchini'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [ingredient.id])
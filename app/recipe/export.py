@@ -0,0 +1,68 @@
+"""
+Export of user recipe collections as JSON Lines
+"""
+from common.streaming import chunked
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+RECIPE_COLUMNS = [
+    'id',
+    'title',
+    'description',
+    'time_minutes',
+    'price',
+    'link',
+    'image',
+]
+
+
+def _names_by_recipe(through, field, recipe_ids):
+    """ Group related names of a M2M relation by recipe id """
+    names = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, name in through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).order_by(f'{field}_id').values_list('recipe_id', f'{field}__name'):
+        names[recipe_id].append(name)
+
+    return names
+
+
+def export_records(user, chunk_size):
+    """
+    Yield the tags, ingredients then recipes of a user as JSON records.
+
+    Rows are read from server-side cursors `chunk_size` at a time, so
+    memory does not grow with the collection. Recipes reference their tags
+    and ingredients by name and images by storage path, prices are strings.
+    """
+    for record_type, model in (('tag', Tag), ('ingredient', Ingredient)):
+        rows = model.objects.filter(user=user).order_by('id').values(
+            'id',
+            'name',
+        )
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield {'type': record_type, **row}
+
+    recipes = Recipe.objects.filter(user=user).order_by('id').values(
+        *RECIPE_COLUMNS,
+    )
+    for chunk in chunked(recipes.iterator(chunk_size=chunk_size), chunk_size):
+        recipe_ids = [row['id'] for row in chunk]
+        tags = _names_by_recipe(Recipe.tags.through, 'tag', recipe_ids)
+        ingredients = _names_by_recipe(
+            Recipe.ingredients.through,
+            'ingredient',
+            recipe_ids,
+        )
+        for row in chunk:
+            yield {
+                'type': 'recipe',
+                **row,
+                'price': str(row['price']),
+                'image': row['image'] or None,
+                'tags': tags[row['id']],
+                'ingredients': ingredients[row['id']],
+            }
@@ -0,0 +1,242 @@
+"""
+Resized variants of recipe images
+"""
+import hashlib
+import io
+import logging
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import (
+    Image,
+    ImageOps,
+)
+from django.db import transaction
+from core.models import (
+    ImageBlob,
+    Recipe,
+    recipe_image_content_path,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pillow format and content options of each variant file format
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+    'webp': ('WEBP', {'method': 4}),
+}
+
+
+def get_variant_keys():
+    """ Return `<size>.<format>` keys of the configured variants """
+    return [
+        f'{size}.{image_format}'
+        for size in settings.RECIPE_IMAGE_VARIANT_SIZES
+        for image_format in settings.RECIPE_IMAGE_VARIANT_FORMATS
+    ]
+
+
+def variant_name(name, key):
+    """ Return the storage name of a variant of an image """
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_{key}'
+
+
+def encode_image(image, image_format):
+    """ Return the bytes of an image saved in a variant format """
+    pillow_format, options = VARIANT_FORMATS[image_format]
+    if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format=pillow_format,
+        quality=settings.RECIPE_IMAGE_VARIANT_QUALITY,
+        **options,
+    )
+
+    return buffer.getvalue()
+
+
+def file_digest(file):
+    """
+    Return the SHA-256 hex digest of an uploaded file, as computed by the
+    upload handlers or else by reading it
+    """
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        file.seek(0)
+
+    return digest
+
+
+def touch_content(name, storage=default_storage):
+    """
+    Refresh the modification time of a stored file, so garbage collection
+    keeps it for another grace period, and return whether it exists
+    """
+    try:
+        os.utime(storage.path(name))
+    except NotImplementedError:
+        return storage.exists(name)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+def save_content(name, content, storage=default_storage):
+    """
+    Write a file under a content-addressed name unless already stored,
+    keeping the first of concurrent identical writes
+    """
+    if touch_content(name, storage):
+        return
+
+    saved = storage.save(name, content)
+    if saved != name:
+        storage.delete(saved)
+
+
+def store_image(file, storage=default_storage):
+    """
+    Store an uploaded image under the hash of its content unless identical
+    bytes are already stored, and return its digest and name
+    """
+    digest = file_digest(file)
+    name = ImageBlob.objects.get_name(digest) or recipe_image_content_path(
+        digest,
+        os.path.splitext(file.name)[1],
+    )
+    save_content(name, file, storage)
+
+    return digest, name
+
+
+def set_recipe_image(recipe, digest, name, keys):
+    """
+    Point a recipe at a stored image and its variants, moving the recipe
+    reference from its previous image
+    """
+    with transaction.atomic():
+        previous = Recipe.objects.select_for_update().filter(
+            id=recipe.id,
+        ).values_list('image', flat=True).first()
+        stored = ImageBlob.objects.reference(digest, name)
+        ImageBlob.objects.release(previous)
+
+        recipe.image = stored
+        # Variants of a concurrently stored copy are left to the
+        # generate_image_variants command
+        recipe.image_variants = keys if stored == name else []
+        recipe.image_status = Recipe.ImageStatus.READY
+        recipe.save(update_fields=[
+            'image',
+            'image_variants',
+            'image_status',
+            'updated_at',
+        ])
+
+
+def generate_variants(name, keys, storage=default_storage):
+    """
+    Write missing variants of an image, at most `size` pixels wide and high
+    and never upscaled, and return the keys of the available variants.
+    Images are content addressed, so existing variant files are reused and
+    touched, keeping them from garbage collection like the image.
+    """
+    missing = [
+        key for key in keys
+        if not touch_content(variant_name(name, key), storage)
+    ]
+    if not missing:
+        return list(keys)
+
+    try:
+        with storage.open(name) as file, Image.open(file) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, Image.DecompressionBombError):
+        logger.warning('Unable to read recipe image %s', name)
+        return [key for key in keys if key not in missing]
+
+    for key in missing:
+        size, image_format = key.split('.')
+        image = original.copy()
+        image.thumbnail((int(size), int(size)), Image.LANCZOS)
+        save_content(
+            variant_name(name, key),
+            ContentFile(encode_image(image, image_format)),
+            storage,
+        )
+
+    return list(keys)
+
+
+def add_missing_variants(recipe_id, name, generated, storage=None):
+    """
+    Generate configured variants missing from `generated` and record them,
+    or mark the recipe image as failed when it cannot be read, unless the
+    recipe image changed meanwhile. Returns whether the image was read.
+    """
+    missing = [key for key in get_variant_keys() if key not in generated]
+    if not missing:
+        return True
+
+    keys = generate_variants(name, missing, storage or default_storage)
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            id=recipe_id,
+            image=name,
+        ).first()
+        if recipe is not None:
+            if keys:
+                recipe.image_variants = sorted({
+                    *recipe.image_variants,
+                    *keys,
+                })
+            else:
+                recipe.image_status = Recipe.ImageStatus.FAILED
+            recipe.save(update_fields=[
+                'image_variants',
+                'image_status',
+                'updated_at',
+            ])
+
+    return bool(keys)
+
+
+def image_variant_urls(name, keys, request=None):
+    """
+    Return URLs of the recorded variants of a recipe image, or None without
+    image. Variants are never generated while reading.
+    """
+    if not name:
+        return None
+
+    return variant_urls(name, keys, request)
+
+
+def variant_urls(name, keys, request=None):
+    """
+    Return `{size: {format: url}}` of the configured variants of an image
+    among `keys`, absolute when a request is given.
+    """
+    urls = {}
+    for key in get_variant_keys():
+        if key not in keys:
+            continue
+        size, image_format = key.split('.')
+        url = default_storage.url(variant_name(name, key))
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls.setdefault(size, {})[image_format] = url
+
+    return urls
@@ -0,0 +1,273 @@
+"""
+Bulk import of recipes through PostgreSQL COPY
+"""
+import csv
+import gzip
+import io
+import json
+from decimal import (
+    Decimal,
+    InvalidOperation,
+)
+from urllib.parse import (
+    unquote,
+    urlsplit,
+)
+from django.conf import settings
+from django.db import (
+    connection,
+    transaction,
+)
+from common.cache import invalidate_user
+from common.renderers import CSVRenderer
+from core.models import (
+    ImageBlob,
+    ImportCheckpoint,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.media import is_safe_name
+
+# Related table, link table and link column of each M2M field
+RELATED_TABLES = {
+    'tags': (
+        Tag._meta.db_table,
+        Recipe.tags.through._meta.db_table,
+        'tag_id',
+    ),
+    'ingredients': (
+        Ingredient._meta.db_table,
+        Recipe.ingredients.through._meta.db_table,
+        'ingredient_id',
+    ),
+}
+# Record type of tag and ingredient records of JSON Lines exports
+RELATED_RECORD_TYPES = {'tag': 'tags', 'ingredient': 'ingredients'}
+
+STAGING_SQL = '''
+    CREATE TEMPORARY TABLE import_recipe (
+        line bigint PRIMARY KEY,
+        recipe_id bigint,
+        title varchar(255) NOT NULL,
+        description text NOT NULL,
+        time_minutes integer NOT NULL,
+        price numeric(5, 2) NOT NULL,
+        link varchar(255) NOT NULL,
+        image varchar(100)
+    ) ON COMMIT DROP;
+    CREATE TEMPORARY TABLE import_name (
+        line bigint,
+        relation text NOT NULL,
+        name varchar(255) NOT NULL
+    ) ON COMMIT DROP;
+'''
+
+
+def open_records(path):
+    """
+    Yield records of a JSON Lines or CSV file, optionally gzipped.
+
+    JSON Lines files use the export format and are yielded as unparsed
+    lines; records without a type are recipes. CSV files have a header row
+    and `|`-joined tag/ingredient names, as rendered by `CSVRenderer`.
+    Image URLs of API responses are mapped back to storage names by
+    `clean_record`, `image_variants` is ignored.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        if name.endswith('.csv'):
+            renderer = CSVRenderer()
+            for row in csv.DictReader(file):
+                for relation in RELATED_TABLES:
+                    row[relation] = renderer.unflatten(row.get(relation))
+                yield row
+        else:
+            for line in file:
+                if line.strip():
+                    yield line
+
+
+def _clean_text(record, key, max_length=None, required=False):
+    """ Return a text value of a record """
+    value = record.get(key) or ''
+    if not isinstance(value, str):
+        raise ValueError(f'{key} must be a string')
+    if required and not value:
+        raise ValueError(f'{key} is required')
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{key} is longer than {max_length} characters')
+
+    return value
+
+
+def _clean_image(record):
+    """
+    Return the storage name of the image of a record, given as a name or
+    as a URL of the media endpoint, or None
+    """
+    value = _clean_text(record, 'image')
+    path = urlsplit(value).path
+    if path.startswith(settings.MEDIA_URL):
+        value = unquote(path[len(settings.MEDIA_URL):])
+    if value and not is_safe_name(value):
+        raise ValueError('image must be a relative media path')
+    if len(value) > 100:
+        raise ValueError('image is longer than 100 characters')
+
+    return value or None
+
+
+def clean_record(record):
+    """
+    Return the recipe row and relation names of a record, or None and the
+    names of a tag/ingredient record. Raises ValueError for invalid records.
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+
+    record_type = record.get('type', 'recipe')
+    if record_type in RELATED_RECORD_TYPES:
+        name = _clean_text(record, 'name', 255, required=True)
+        return None, {RELATED_RECORD_TYPES[record_type]: [name]}
+    if record_type != 'recipe':
+        raise ValueError(f'unknown record type {record_type!r}')
+
+    try:
+        time_minutes = int(record.get('time_minutes'))
+    except (TypeError, ValueError):
+        raise ValueError('time_minutes must be an integer')
+    try:
+        price = Decimal(str(record.get('price'))).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError('price must be a decimal number')
+    if not price.is_finite() or abs(price) >= 1000:
+        raise ValueError('price must have at most 3 integer digits')
+
+    row = (
+        _clean_text(record, 'title', 255, required=True),
+        _clean_text(record, 'description'),
+        time_minutes,
+        price,
+        _clean_text(record, 'link', 255),
+        _clean_image(record),
+    )
+    names = {}
+    for relation in RELATED_TABLES:
+        items = record.get(relation) or []
+        if not isinstance(items, list):
+            raise ValueError(f'{relation} must be a list')
+        names[relation] = [
+            item.get('name') if isinstance(item, dict) else item
+            for item in items
+        ]
+        for name in names[relation]:
+            if not isinstance(name, str) or not 0 < len(name) <= 255:
+                raise ValueError(f'invalid name in {relation}')
+
+    return row, names
+
+
+def _copy(cursor, table, columns, rows, force_not_null=()):
+    """ Load rows into a table with COPY """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    options = 'FORMAT csv'
+    if force_not_null:
+        options += f', FORCE_NOT_NULL ({", ".join(force_not_null)})'
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH ({options})',
+        buffer,
+    )
+
+
+def import_batch(user, recipes, names, checkpoint, position):
+    """
+    Import a batch of recipes in one transaction.
+
+    `recipes` holds `(line, row)` pairs and `names` `(line, relation,
+    name)` triples, with a None line for names not linked to a recipe.
+    Rows are copied into staging tables, tags and ingredients are upserted
+    by name and links inserted with set-based statements. Stored images
+    used by imported recipes gain a reference each, as recipe deletion
+    releases one. The checkpoint position is saved in the same transaction.
+    """
+    recipe_table = Recipe._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(STAGING_SQL)
+        _copy(
+            cursor,
+            'import_recipe',
+            [
+                'line',
+                'title',
+                'description',
+                'time_minutes',
+                'price',
+                'link',
+                'image',
+            ],
+            [(line, *row) for line, row in recipes],
+            force_not_null=['title', 'description', 'link'],
+        )
+        _copy(
+            cursor,
+            'import_name',
+            ['line', 'relation', 'name'],
+            names,
+            force_not_null=['name'],
+        )
+
+        # Allocate ids up front so links can be joined by input line
+        cursor.execute(
+            'UPDATE import_recipe SET recipe_id = '
+            f"nextval(pg_get_serial_sequence('{recipe_table}', 'id'))"
+        )
+        cursor.execute(
+            f'INSERT INTO {recipe_table} (id, user_id, title, description, '
+            'time_minutes, price, link, image, image_variants, '
+            'image_status, updated_at) '
+            'SELECT recipe_id, %s, title, description, time_minutes, '
+            "price, link, image, '[]', %s, now() FROM import_recipe "
+            'ORDER BY line',
+            [user.id, Recipe.ImageStatus.READY],
+        )
+        cursor.execute(
+            f'UPDATE {ImageBlob._meta.db_table} AS blob '
+            'SET "references" = blob."references" + imported.count '
+            'FROM (SELECT image, count(*) AS count FROM import_recipe '
+            'WHERE image IS NOT NULL GROUP BY image) AS imported '
+            'WHERE blob.name = imported.image'
+        )
+        for relation, (table, link_table, column) in RELATED_TABLES.items():
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, name, updated_at) '
+                'SELECT DISTINCT %s, name, now() FROM import_name '
+                'WHERE relation = %s ON CONFLICT (user_id, name) DO NOTHING',
+                [user.id, relation],
+            )
+            cursor.execute(
+                f'INSERT INTO {link_table} (recipe_id, {column}) '
+                'SELECT DISTINCT staged.recipe_id, related.id '
+                'FROM import_name AS link '
+                'JOIN import_recipe AS staged ON staged.line = link.line '
+                f'JOIN {table} AS related '
+                'ON related.user_id = %s AND related.name = link.name '
+                'WHERE link.relation = %s ON CONFLICT DO NOTHING',
+                [user.id, relation],
+            )
+
+        # Dropped on commit too, explicitly for batches in an outer
+        # transaction
+        cursor.execute('DROP TABLE import_recipe, import_name')
+
+        ImportCheckpoint.objects.update_or_create(
+            name=checkpoint,
+            defaults={'position': position},
+        )
+        # Raw SQL sends no signal to invalidate cached responses
+        invalidate_user(user.id)
@@ -0,0 +1,69 @@
+"""
+Django command deleting recipe image files no recipe references.
+"""
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from common.streaming import chunked
+from core.models import Recipe
+from recipe.media import (
+    delete_unreferenced,
+    iter_unreferenced_files,
+)
+
+
+class Command(BaseCommand):
+    """ Django command to garbage collect orphaned recipe images """
+    help = (
+        'Delete recipe image files and variants not referenced by any '
+        'recipe and older than a grace period'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=settings.RECIPE_IMAGE_GC_GRACE,
+            help='Seconds since the last change of files to keep',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Rows read per database round trip and files per deletion',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report unreferenced files without deleting them',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        storage = Recipe._meta.get_field('image').storage
+        try:
+            storage.path('')
+        except NotImplementedError:
+            raise CommandError('Images are not stored on a local filesystem')
+
+        files = iter_unreferenced_files(
+            storage,
+            options['grace'],
+            options['chunk_size'],
+        )
+        count = size = 0
+        for chunk in chunked(files, options['chunk_size']):
+            sizes = dict(chunk)
+            names = list(sizes)
+            if not options['dry_run']:
+                names = delete_unreferenced(storage, names, options['grace'])
+            for name in names:
+                self.stdout.write(name)
+            count += len(names)
+            size += sum(sizes[name] for name in names)
+
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {count} files ({size} bytes)'))
@@ -0,0 +1,67 @@
+"""
+Django command exporting the recipe collection of a user as JSON Lines.
+"""
+import sys
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from common.renderers import JSONLinesRenderer
+from common.streaming import (
+    buffered,
+    gzipped,
+)
+from recipe.export import export_records
+
+
+class Command(BaseCommand):
+    """ Django command to export tags, ingredients and recipes of a user """
+    help = 'Export tags, ingredients and recipes of a user as JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the exported user')
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write, "-" (default) for standard output',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the export with gzip',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.RECIPE_STREAM_CHUNK_SIZE,
+            help='Rows read per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{options["email"]}" does not exist')
+
+        records = export_records(user, options['chunk_size'])
+        blocks = buffered(JSONLinesRenderer().stream(records))
+        if options['gzip']:
+            blocks = gzipped(blocks)
+
+        if options['output'] == '-':
+            self._write(sys.stdout.buffer, blocks)
+            return
+
+        with open(options['output'], 'wb') as output:
+            self._write(output, blocks)
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported recipes of {user.email} to {options["output"]}'))
+
+    def _write(self, output, blocks):
+        """ Write blocks of bytes to a binary file """
+        for block in blocks:
+            output.write(block)
+        output.flush()
@@ -0,0 +1,56 @@
+"""
+Django command generating missing variants of recipe images.
+"""
+from django.core.management.base import BaseCommand
+from core.models import Recipe
+from recipe.images import (
+    add_missing_variants,
+    get_variant_keys,
+)
+
+
+class Command(BaseCommand):
+    """ Django command to generate newly configured image variants """
+    help = (
+        'Generate the configured variants missing from recipe images, '
+        'marking images that cannot be read as failed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Recipes read per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        storage = Recipe._meta.get_field('image').storage
+        # Failed images are not retried until a new upload
+        recipes = Recipe.objects.filter(
+            image_status=Recipe.ImageStatus.READY,
+        ).exclude(image__isnull=True).exclude(image='').exclude(
+            image_variants__contains=get_variant_keys(),
+        ).order_by('id')
+
+        position = generated = failed = 0
+        while True:
+            rows = list(recipes.filter(id__gt=position).values_list(
+                'id',
+                'image',
+                'image_variants',
+            )[:options['batch_size']])
+            if not rows:
+                break
+
+            for recipe_id, name, keys in rows:
+                if add_missing_variants(recipe_id, name, keys, storage):
+                    generated += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Unable to read {name}')
+            position = rows[-1][0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants of {generated} images, {failed} failed'))
@@ -0,0 +1,107 @@
+"""
+Django command importing recipes of a user from JSON Lines or CSV files.
+"""
+import os
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from core.models import ImportCheckpoint
+from recipe.imports import (
+    clean_record,
+    import_batch,
+    open_records,
+)
+
+
+class Command(BaseCommand):
+    """ Django command to bulk import recipes with COPY """
+    help = (
+        'Import recipes of a user from a JSON Lines (export format) or CSV '
+        'file, optionally gzipped, resuming from the last checkpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the recipes owner')
+        parser.add_argument('path', help='.jsonl or .csv file, may be .gz')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Records imported per transaction',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint name, defaults to the user and file path',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the saved checkpoint and import from the start',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{options["email"]}" does not exist')
+
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'File "{path}" does not exist')
+        checkpoint = options['checkpoint'] or f'recipes:{user.id}:{path}'
+
+        start = 0
+        if not options['restart']:
+            start = ImportCheckpoint.objects.filter(
+                name=checkpoint,
+            ).values_list('position', flat=True).first() or 0
+        if start:
+            self.stdout.write(f'Resuming after record {start}')
+
+        self.started = time.monotonic()
+        self.imported = self.skipped = 0
+        recipes, names = [], []
+        position = 0
+        for position, record in enumerate(open_records(path), 1):
+            if position <= start:
+                continue
+
+            try:
+                row, record_names = clean_record(record)
+            except ValueError as exc:
+                self.skipped += 1
+                self.stderr.write(f'Skipped record {position}: {exc}')
+                continue
+
+            line = None
+            if row is not None:
+                line = position
+                recipes.append((line, row))
+            for relation, items in record_names.items():
+                names.extend((line, relation, name) for name in items)
+
+            if position % options['batch_size'] == 0:
+                self._import(user, recipes, names, checkpoint, position)
+                recipes, names = [], []
+
+        if position > start:
+            self._import(user, recipes, names, checkpoint, position)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} recipes, skipped {self.skipped} '
+            'invalid records'
+        ))
+
+    def _import(self, user, recipes, names, checkpoint, position):
+        """ Import a batch and report progress """
+        import_batch(user, recipes, names, checkpoint, position)
+        self.imported += len(recipes)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'Record {position}: {self.imported} recipes imported '
+            f'({self.imported / max(elapsed, 1e-6):.0f}/s)'
+        )
@@ -0,0 +1,116 @@
+"""
+Django command processing queued recipe image uploads in worker processes.
+"""
+import multiprocessing
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipe.processing import (
+    claimable_jobs,
+    process_job,
+)
+
+
+class Command(BaseCommand):
+    """ Django command to run the recipe image workers """
+    help = (
+        'Re-encode queued recipe image uploads and generate their variants '
+        'in a pool of worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.RECIPE_IMAGE_WORKERS,
+            help='Worker processes, 0 to process jobs in this process',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls of an empty queue',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        workers = options['workers']
+        executor = None
+        if workers > 0:
+            # Spawned workers open their own database connections
+            executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+
+        self.processed = 0
+        try:
+            if executor is None:
+                self._run_inline(options)
+            else:
+                self._run_pool(executor, workers, options)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {self.processed} images'))
+
+    def _pending(self, exclude=(), limit=None):
+        """ Return ids of claimable jobs, oldest first """
+        jobs = claimable_jobs().exclude(id__in=exclude).order_by('id')
+        return list(jobs.values_list('id', flat=True)[:limit])
+
+    def _run_inline(self, options):
+        """ Process jobs one at a time in this process """
+        while True:
+            job_ids = self._pending(limit=100)
+            for job_id in job_ids:
+                self.processed += process_job(job_id)
+            if not job_ids:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+
+    def _run_pool(self, executor, workers, options):
+        """ Keep up to two jobs per worker submitted to the pool """
+        running = {}
+        while True:
+            free = 2 * workers - len(running)
+            job_ids = []
+            if free:
+                job_ids = self._pending(exclude=running, limit=free)
+            for job_id in job_ids:
+                running[job_id] = executor.submit(process_job, job_id)
+
+            if not running:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            done, _ = wait(
+                running.values(),
+                timeout=options['interval'],
+                return_when=FIRST_COMPLETED,
+            )
+            for job_id, future in list(running.items()):
+                if future not in done:
+                    continue
+                del running[job_id]
+                try:
+                    self.processed += future.result()
+                except Exception as exc:
+                    self.stderr.write(f'Failed image job {job_id}: {exc}')
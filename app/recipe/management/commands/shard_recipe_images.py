@@ -0,0 +1,81 @@
+"""
+Django command moving recipe images to the sharded directory layout.
+"""
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from core.models import (
+    ImportCheckpoint,
+    Recipe,
+)
+from recipe.media import (
+    FLAT_IMAGE_PATTERN,
+    shard_images,
+)
+
+CHECKPOINT = 'shard-recipe-images'
+
+
+class Command(BaseCommand):
+    """ Django command to migrate flat recipe images in batches """
+    help = (
+        'Move recipe images from uploads/recipe/ into two levels of hex '
+        'prefix directories, resuming after the last migrated recipe'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Recipes migrated per transaction',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the saved checkpoint and scan from the first recipe',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        storage = Recipe._meta.get_field('image').storage
+        try:
+            storage.path('')
+        except NotImplementedError:
+            raise CommandError('Images are not stored on a local filesystem')
+
+        position = 0
+        if not options['restart']:
+            position = ImportCheckpoint.objects.filter(
+                name=CHECKPOINT,
+            ).values_list('position', flat=True).first() or 0
+        if position:
+            self.stdout.write(f'Resuming after recipe {position}')
+
+        moved = 0
+        while True:
+            # Walks the primary key, migrated images no longer match
+            rows = list(Recipe.objects.filter(
+                id__gt=position,
+                image__regex=FLAT_IMAGE_PATTERN,
+            ).order_by('id').values_list(
+                'id',
+                'image',
+                'image_variants',
+            )[:options['batch_size']])
+            if not rows:
+                break
+
+            moved += shard_images(
+                [(image, keys) for _, image, keys in rows],
+                storage,
+            )
+            position = rows[-1][0]
+            ImportCheckpoint.objects.update_or_create(
+                name=CHECKPOINT,
+                defaults={'position': position},
+            )
+            self.stdout.write(f'Moved {moved} images, up to recipe {position}')
+
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} images'))
@@ -0,0 +1,303 @@
+"""
+Layout, access control and garbage collection of recipe image files
+"""
+import heapq
+import mimetypes
+import os
+import re
+import time
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models.functions import Collate
+from common.cache import invalidate_user
+from core.models import (
+    ImageBlob,
+    Recipe,
+    recipe_image_shard_path,
+)
+from recipe.images import (
+    get_variant_keys,
+    variant_name,
+)
+
+# Recipe images stored directly in `uploads/recipe/`
+FLAT_IMAGE_PATTERN = r'^uploads/recipe/[^/]+$'
+# Media directory holding recipe images and their variants
+RECIPE_IMAGE_DIR = 'uploads/recipe'
+# Names of variant files, `<image stem>_<size>.<format>`
+VARIANT_NAME_PATTERN = re.compile(
+    r'^(?P<stem>.+)_(?P<size>\d+)\.(?P<format>[a-z]+)$'
+)
+# Image files never change under a name, browsers may keep them a day
+MEDIA_MAX_AGE = 86400
+
+# Missing from the types known to older Python versions
+mimetypes.add_type('image/webp', '.webp')
+
+
+def sharded_name(name):
+    """ Return the sharded path of a recipe image of the flat layout """
+    return recipe_image_shard_path(os.path.basename(name))
+
+
+def is_safe_name(name):
+    """ Return whether a media name is relative and stays inside media """
+    parts = name.split('/')
+    return not name.startswith('/') and not {'', '.', '..'} & set(parts)
+
+
+def owns_image(user, name):
+    """
+    Return whether a recipe of the user uses an image, or one of its
+    generated variants
+    """
+    recipes = Recipe.objects.filter(user=user)
+    if recipes.filter(image=name).exists():
+        return True
+
+    match = VARIANT_NAME_PATTERN.match(name)
+    if match is None:
+        return False
+    key = f'{match["size"]}.{match["format"]}'
+    images = recipes.filter(
+        image__startswith=match['stem'],
+        image_variants__contains=[key],
+    ).values_list('image', flat=True)
+
+    return any(variant_name(image, key) == name for image in images)
+
+
+def media_content_type(name):
+    """ Return the content type of a media file """
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def _link(storage, name, target):
+    """
+    Hard link a file under a new name unless already linked, and return
+    whether the file exists under the new name
+    """
+    destination = storage.path(target)
+    if os.path.exists(destination):
+        return True
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(storage.path(name), destination)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+def shard_images(images, storage):
+    """
+    Move images given as `(name, variant keys)` pairs from the flat layout
+    to the sharded one and return the number of moved images.
+
+    Images and variants are hard linked under their sharded names first.
+    Recipe and stored image paths are then renamed in bulk in one
+    transaction, and the flat names unlinked after it commits, so every
+    committed path stays readable. Images missing on disk are left as is.
+    """
+    variants = {}
+    for name, keys in images:
+        variants.setdefault(name, set(get_variant_keys())).update(keys)
+
+    moves = {}
+    for name, keys in variants.items():
+        target = sharded_name(name)
+        if not _link(storage, name, target):
+            continue
+        for key in keys:
+            _link(storage, variant_name(name, key), variant_name(target, key))
+        moves[name] = target
+    if not moves:
+        return 0
+
+    moved = f'(VALUES {", ".join(["(%s, %s)"] * len(moves))})'
+    params = [path for move in moves.items() for path in move]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Recipe._meta.db_table} AS recipe '
+            'SET image = moved.target, updated_at = now() '
+            f'FROM {moved} AS moved (name, target) '
+            'WHERE recipe.image = moved.name RETURNING recipe.user_id',
+            params,
+        )
+        user_ids = {user_id for user_id, in cursor.fetchall()}
+        cursor.execute(
+            f'UPDATE {ImageBlob._meta.db_table} AS blob '
+            'SET name = moved.target '
+            f'FROM {moved} AS moved (name, target) '
+            'WHERE blob.name = moved.name',
+            params,
+        )
+
+        # Raw SQL sends no signal to invalidate cached responses
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+    for name in moves:
+        for key in variants[name]:
+            storage.delete(variant_name(name, key))
+        storage.delete(name)
+
+    return len(moves)
+
+
+def iter_media_files(storage, directory=RECIPE_IMAGE_DIR):
+    """
+    Yield `(name, stat)` of the files under a media directory in code point
+    order of their names, listing one directory at a time
+    """
+    def walk(path, prefix):
+        with os.scandir(path) as entries:
+            # Sorting directories as `name/` keeps whole paths in order
+            entries = sorted(entries, key=lambda entry: (
+                f'{entry.name}/' if entry.is_dir(follow_symlinks=False)
+                else entry.name
+            ))
+        for entry in entries:
+            name = f'{prefix}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path, name)
+            elif entry.is_file(follow_symlinks=False):
+                yield name, entry.stat(follow_symlinks=False)
+
+    root = storage.path(directory)
+    if os.path.isdir(root):
+        yield from walk(root, directory)
+
+
+def iter_referenced_names(chunk_size):
+    """
+    Yield names of images referenced by recipes or by stored images in use,
+    and of their variants, in code point order, possibly repeated.
+
+    Both tables are read sorted by the database through server-side
+    cursors. Variant names sort after their image, so they are held in a
+    heap only until the image names read catch up with them.
+    """
+    recipes = Recipe.objects.exclude(image__isnull=True).exclude(
+        image='',
+    ).order_by(Collate('image', 'C')).values_list(
+        'image',
+        'image_variants',
+    ).iterator(chunk_size=chunk_size)
+    blobs = (
+        (name, []) for name in ImageBlob.objects.filter(
+            references__gt=0,
+        ).order_by(Collate('name', 'C')).values_list(
+            'name',
+            flat=True,
+        ).iterator(chunk_size=chunk_size)
+    )
+    configured = get_variant_keys()
+
+    variants = []
+    for name, keys in heapq.merge(recipes, blobs, key=lambda row: row[0]):
+        while variants and variants[0] <= name:
+            yield heapq.heappop(variants)
+        yield name
+        for key in {*configured, *keys}:
+            heapq.heappush(variants, variant_name(name, key))
+
+    while variants:
+        yield heapq.heappop(variants)
+
+
+def iter_unreferenced_files(storage, grace, chunk_size):
+    """
+    Yield `(name, size)` of recipe image files not referenced and not
+    modified for `grace` seconds, merge joining the sorted media tree with
+    the sorted referenced names
+    """
+    cutoff = time.time() - grace
+    referenced = iter_referenced_names(chunk_size)
+    current = next(referenced, None)
+    for name, stat in iter_media_files(storage):
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if name != current and stat.st_mtime < cutoff:
+            yield name, stat.st_size
+
+
+def _original_names(storage, names):
+    """
+    Return the names of the files in the directory of each variant name
+    that it may be a variant of, i.e. sharing its stem, with its key
+    """
+    listings = {}
+    originals = {}
+    for name in names:
+        match = VARIANT_NAME_PATTERN.match(name)
+        if match is None:
+            continue
+        directory, stem = os.path.split(match['stem'])
+        if directory not in listings:
+            try:
+                listings[directory] = os.listdir(storage.path(directory))
+            except FileNotFoundError:
+                listings[directory] = []
+        originals[name] = (f'{match["size"]}.{match["format"]}', [
+            f'{directory}/{entry}' for entry in listings[directory]
+            if os.path.splitext(entry)[0] == stem
+        ])
+
+    return originals
+
+
+def delete_unreferenced(storage, names, grace):
+    """
+    Delete unreferenced image files, with their unused stored image rows,
+    and return the deleted names.
+
+    References and modification times are checked again with the stored
+    image rows locked. Configured or recorded variants are checked through
+    the image they belong to, so images and variants that concurrent
+    uploads reuse are kept.
+    """
+    cutoff = time.time() - grace
+    originals = _original_names(storage, names)
+    checked = set(names).union(*(
+        images for _, images in originals.values()
+    ))
+    configured = set(get_variant_keys())
+    with transaction.atomic():
+        blobs = dict(ImageBlob.objects.select_for_update().filter(
+            name__in=checked,
+        ).values_list('name', 'references'))
+        recorded = {}
+        for image, keys in Recipe.objects.filter(
+            image__in=checked,
+        ).values_list('image', 'image_variants'):
+            recorded.setdefault(image, set()).update(keys)
+
+        def in_use(image):
+            return blobs.get(image) or image in recorded
+
+        deleted = []
+        for name in names:
+            if in_use(name):
+                continue
+            key, images = originals.get(name, (None, ()))
+            if any(
+                in_use(image) and (
+                    key in configured or key in recorded.get(image, ())
+                )
+                for image in images
+            ):
+                continue
+            try:
+                if os.stat(storage.path(name)).st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            storage.delete(name)
+            deleted.append(name)
+        ImageBlob.objects.filter(name__in=deleted).delete()
+
+    return deleted
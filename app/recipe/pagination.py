@@ -0,0 +1,39 @@
+"""
+Pagination classes for recipe APIs
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over recipes ordered by newest first.
+
+    Each page is a range scan on the `(user_id, id)` index instead of an
+    OFFSET, so the cost of a page does not grow with the collection size.
+    Pagination is only applied when the client sends `cursor` or
+    `page_size`, so existing clients keep receiving a plain list.
+    Search results are paged by relevance with the same cursors.
+    """
+    ordering = '-id'
+    page_size = settings.RECIPE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def is_requested(self, request):
+        """ Check whether the client opted into pagination """
+        return (
+            self.cursor_query_param in request.query_params or
+            self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """ Paginate the queryset only when pagination is requested """
+        if not self.is_requested(request):
+            return None
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        """ Use the ordering of the view, e.g. relevance for searches """
+        return view.get_ordering()
@@ -0,0 +1,176 @@
+"""
+Asynchronous processing of spooled recipe image uploads
+"""
+import logging
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import (
+    ContentFile,
+    File,
+)
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import (
+    Image,
+    ImageOps,
+)
+from core.models import (
+    ImageBlob,
+    ImageJob,
+    Recipe,
+    recipe_image_content_path,
+)
+from recipe.images import (
+    encode_image,
+    file_digest,
+    generate_variants,
+    get_variant_keys,
+    save_content,
+    set_recipe_image,
+    touch_content,
+)
+
+logger = logging.getLogger(__name__)
+
+# Variant format of re-encoded originals by Pillow format, others are
+# re-encoded as JPEG
+ORIGINAL_FORMATS = {'JPEG': 'jpeg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def spool_upload(file):
+    """
+    Move an uploaded file into the spool directory, copying in-memory
+    uploads, and return its path
+    """
+    os.makedirs(settings.RECIPE_IMAGE_SPOOL_DIR, exist_ok=True)
+    ext = os.path.splitext(file.name)[1]
+    path = os.path.join(
+        settings.RECIPE_IMAGE_SPOOL_DIR,
+        f'{uuid.uuid4()}{ext}',
+    )
+
+    if hasattr(file, 'temporary_file_path'):
+        shutil.move(file.temporary_file_path(), path)
+    else:
+        with open(path, 'wb') as spooled:
+            for chunk in file.chunks():
+                spooled.write(chunk)
+
+    return path
+
+
+def enqueue_image(recipe, file):
+    """ Spool an uploaded image and queue it for the image workers """
+    digest = file_digest(file)
+    path = spool_upload(file)
+    try:
+        with transaction.atomic():
+            job = ImageJob.objects.create(
+                recipe=recipe,
+                upload=path,
+                digest=digest,
+            )
+            recipe.image_status = Recipe.ImageStatus.PROCESSING
+            recipe.save(update_fields=['image_status', 'updated_at'])
+    except Exception:
+        os.remove(path)
+        raise
+
+    return job
+
+
+def claimable_jobs():
+    """ Return jobs not claimed by a worker, or claimed too long ago """
+    timeout = timedelta(seconds=settings.RECIPE_IMAGE_JOB_TIMEOUT)
+    return ImageJob.objects.filter(
+        Q(started_at__isnull=True) | Q(started_at__lt=timezone.now() - timeout)
+    )
+
+
+def claim_job(job_id):
+    """ Mark a job as started and return it, or None if already claimed """
+    with transaction.atomic():
+        job = claimable_jobs().select_for_update(skip_locked=True).filter(
+            id=job_id,
+        ).first()
+        if job is not None:
+            job.started_at = timezone.now()
+            job.save(update_fields=['started_at'])
+
+    return job
+
+
+def encode_upload(path):
+    """
+    Return the re-encoded content and extension of an uploaded image,
+    rotated by its EXIF orientation and without EXIF metadata
+    """
+    with Image.open(path) as original:
+        image_format = ORIGINAL_FORMATS.get(original.format, 'jpeg')
+        icc_profile = original.info.get('icc_profile')
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    # Drop every metadata block, keeping the color profile
+    image.info = {'icc_profile': icc_profile} if icc_profile else {}
+
+    return encode_image(image, image_format), image_format
+
+
+def process_job(job_id):
+    """
+    Process a queued image upload and return whether it was claimed.
+
+    Uploads of already stored bytes reuse the stored image. Others are
+    re-encoded and stored by the hash of the upload, and variants generated
+    outside any transaction. The recipe image, variants and status are then
+    updated in one statement, unless a later upload superseded this one.
+    Images of superseded uploads are left to garbage collection.
+    """
+    job = claim_job(job_id)
+    if job is None:
+        return False
+
+    if not job.digest:
+        # Queued before uploads were hashed
+        with open(job.upload, 'rb') as upload:
+            job.digest = file_digest(File(upload))
+
+    storage = Recipe._meta.get_field('image').storage
+    keys = []
+    name = ImageBlob.objects.get_name(job.digest)
+    if name is None or not touch_content(name, storage):
+        try:
+            content, image_format = encode_upload(job.upload)
+        except (OSError, Image.DecompressionBombError):
+            logger.warning('Unable to process recipe image %s', job.upload)
+            name = None
+        else:
+            name = name or recipe_image_content_path(
+                job.digest,
+                f'.{image_format}',
+            )
+            save_content(name, ContentFile(content), storage)
+    if name:
+        keys = generate_variants(name, get_variant_keys(), storage)
+
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            id=job.recipe_id,
+        ).first()
+        latest = recipe is not None and not ImageJob.objects.filter(
+            recipe_id=job.recipe_id,
+            id__gt=job.id,
+        ).exists()
+        if latest and name:
+            set_recipe_image(recipe, job.digest, name, keys)
+        elif latest:
+            recipe.image_status = Recipe.ImageStatus.FAILED
+            recipe.save(update_fields=['image_status', 'updated_at'])
+        job.delete()
+
+    return True
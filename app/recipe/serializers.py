@@ -1,20 +1,112 @@
 """
 Serializers for recipe API view
 """
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from common.cache import invalidate_user
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
+from recipe.images import (
+    generate_variants,
+    get_variant_keys,
+    image_variant_urls,
+    set_recipe_image,
+    store_image,
+)
+from recipe.processing import enqueue_image
 from tag.serializers import TagSerializer
 from ingredient.serializers import IngredientSerializer
 
 
+class RecipeBulkSerializer(serializers.ListSerializer):
+    """ List serializer writing many recipes with set-based SQL """
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """ Create recipes with one insert per table """
+        related = {
+            name: [attrs.pop(name, []) for attrs in validated_data]
+            for name in self.child.related_fields
+        }
+
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**attrs) for attrs in validated_data]
+        )
+        for name, items_per_recipe in related.items():
+            self.child._link_related(name, recipes, items_per_recipe)
+
+        # bulk_create() sends no signal to invalidate cached responses
+        invalidate_user(self.context['request'].user.id)
+
+        return recipes
+
+    @transaction.atomic
+    def update(self, instances, validated_data):
+        """ Update recipes with one statement per table """
+        related = {name: ([], []) for name in self.child.related_fields}
+        changed_ids = set()
+        changed_fields = {'updated_at'}
+
+        for instance, attrs in zip(instances, validated_data):
+            for name, (recipes, items_per_recipe) in related.items():
+                items = attrs.pop(name, None)
+                if items is not None:
+                    recipes.append(instance)
+                    items_per_recipe.append(items)
+
+            changed = [
+                key for key, value in attrs.items()
+                if getattr(instance, key) != value
+            ]
+            for key in changed:
+                setattr(instance, key, attrs[key])
+            if changed:
+                changed_ids.add(instance.id)
+                changed_fields.update(changed)
+
+        for name, (recipes, items_per_recipe) in related.items():
+            if recipes:
+                changed_ids |= self.child._set_related(
+                    name,
+                    recipes,
+                    items_per_recipe,
+                )
+
+        changed_recipes = [
+            instance for instance in instances
+            if instance.id in changed_ids
+        ]
+        if changed_recipes:
+            # bulk_update() does not apply auto_now
+            now = timezone.now()
+            for instance in changed_recipes:
+                instance.updated_at = now
+            Recipe.objects.bulk_update(changed_recipes, sorted(changed_fields))
+            # bulk_update() sends no signal to invalidate cached responses
+            invalidate_user(self.context['request'].user.id)
+
+        return instances
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """ Serializer for recipe object """
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    image_variants = serializers.SerializerMethodField()
+
+    # Related model and through-table column of each M2M field
+    related_fields = {
+        'tags': (Tag, 'tag_id'),
+        'ingredients': (Ingredient, 'ingredient_id'),
+    }
+    # Columns read by fields not backed by the column of the same name
+    field_columns = {'image_variants': ['image', 'image_variants']}
 
     class Meta:
         model = Recipe
@@ -27,56 +119,179 @@ class RecipeSerializer(serializers.ModelSerializer):
             'tags',
             'ingredients',
             'image',
+            'image_variants',
+            'image_status',
         ]
-        read_only_fields = ['id']
+        # Images are only set through the upload endpoint, which stores
+        # them by content hash with their variants
+        read_only_fields = ['id', 'image', 'image_status']
+        list_serializer_class = RecipeBulkSerializer
 
-    def _get_or_create_tags(self, tags, recipe):
-        """ Get or create tags """
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, is_created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+    @classmethod
+    def get_columns(cls, fields):
+        """ Return the model columns read by the given fields """
+        columns = {'id'}
+        for name in fields:
+            if name not in cls.related_fields:
+                columns.update(cls.field_columns.get(name, [name]))
+
+        return columns
+
+    @extend_schema_field({
+        'type': 'object',
+        'nullable': True,
+        'additionalProperties': {
+            'type': 'object',
+            'additionalProperties': {'type': 'string', 'format': 'uri'},
+        },
+        'description': 'Variant URLs by size then file format',
+    })
+    def get_image_variants(self, recipe):
+        """ Return URLs of the resized variants of the recipe image """
+        return image_variant_urls(
+            recipe.image.name,
+            recipe.image_variants,
+            self.context.get('request'),
+        )
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """ Get or create ingredients """
+    def get_fields(self):
+        """
+        Return the fields selected by the `fields` context, rendering
+        relations missing from the `expand` context as ids
+        """
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if selected is None:
+            return fields
+
+        expand = self.context.get('expand', ())
+        fields = {
+            name: field for name, field in fields.items()
+            if name in selected
+        }
+        for name in self.related_fields:
+            if name in fields and name not in expand:
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    many=True,
+                    read_only=True,
+                )
+
+        return fields
+
+    def _get_or_create_related(self, model, items):
+        """
+        Get or create tags/ingredients of the authenticated user by name.
+
+        Missing rows are inserted with one `INSERT ... ON CONFLICT DO
+        NOTHING`, so concurrent requests cannot create duplicates, then
+        every submitted row is loaded with one SELECT.
+        """
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, is_created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
+        names = list(dict.fromkeys(item['name'] for item in items))
+        if not names:
+            return {}
+
+        model.objects.bulk_create(
+            [model(user=auth_user, name=name) for name in names],
+            ignore_conflicts=True,
+        )
+        return {
+            obj.name: obj
+            for obj in model.objects.filter(user=auth_user, name__in=names)
+        }
+
+    def _wanted_links(self, name, recipes, items_per_recipe):
+        """ Return the `(recipe_id, related_id)` pairs to be stored """
+        model = self.related_fields[name][0]
+        related = self._get_or_create_related(
+            model,
+            [item for items in items_per_recipe for item in items],
+        )
+
+        return {
+            (recipe.id, related[item['name']].id)
+            for recipe, items in zip(recipes, items_per_recipe)
+            for item in items
+        }
+
+    def _link_related(self, name, recipes, items_per_recipe):
+        """ Link new recipes to their tags/ingredients with one insert """
+        field = self.related_fields[name][1]
+        through = getattr(Recipe, name).through
+        links = self._wanted_links(name, recipes, items_per_recipe)
+
+        through.objects.bulk_create(
+            [through(recipe_id=recipe_id, **{field: related_id})
+             for recipe_id, related_id in links],
+            ignore_conflicts=True,
+        )
+
+    def _set_related(self, name, recipes, items_per_recipe):
+        """
+        Replace the links of recipes by only writing the difference.
+
+        Links kept by the update are left untouched instead of being
+        cleared and re-added. Returns the ids of recipes whose links
+        changed.
+        """
+        field = self.related_fields[name][1]
+        through = getattr(Recipe, name).through
+        wanted = self._wanted_links(name, recipes, items_per_recipe)
+
+        current = {}
+        for link_id, recipe_id, related_id in through.objects.filter(
+            recipe_id__in=[recipe.id for recipe in recipes],
+        ).values_list('id', 'recipe_id', field):
+            current[(recipe_id, related_id)] = link_id
+
+        removed = {
+            link: link_id for link, link_id in current.items()
+            if link not in wanted
+        }
+        if removed:
+            through.objects.filter(id__in=removed.values()).delete()
+
+        added = wanted - current.keys()
+        if added:
+            through.objects.bulk_create(
+                [through(recipe_id=recipe_id, **{field: related_id})
+                 for recipe_id, related_id in added],
+                ignore_conflicts=True,
             )
-            recipe.ingredients.add(ingredient_obj)
 
+        return {recipe_id for recipe_id, related_id in removed.keys() | added}
+
+    @transaction.atomic
     def create(self, validated_data):
         """ Create a recipe """
-        tags = validated_data.pop('tags', [])
-        ingredients = validated_data.pop('ingredients', [])
+        related = {
+            name: validated_data.pop(name, [])
+            for name in self.related_fields
+        }
 
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        for name, items in related.items():
+            self._link_related(name, [recipe], [items])
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """ Update a recipe """
-        tags = validated_data.pop('tags', None)
-        ingredients = validated_data.pop('ingredients', None)
-
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+        relinked = False
+        for name in self.related_fields:
+            items = validated_data.pop(name, None)
+            if items is not None:
+                relinked |= bool(self._set_related(name, [instance], [items]))
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
-
-        for key, value in validated_data.items():
-            setattr(instance, key, value)
-        instance.save()
+        changed_fields = [
+            key for key, value in validated_data.items()
+            if getattr(instance, key) != value
+        ]
+        for key in changed_fields:
+            setattr(instance, key, validated_data[key])
+        if changed_fields or relinked:
+            instance.save(update_fields=changed_fields + ['updated_at'])
 
         return instance
 
@@ -87,14 +302,200 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description']
 
 
+class RecipeValuesListSerializer(serializers.ListSerializer):
+    """ List serializer merging tag and ingredient rows by recipe id """
+    # Through table and related column of each M2M field
+    related_fields = {
+        'tags': (Recipe.tags.through, 'tag'),
+        'ingredients': (Recipe.ingredients.through, 'ingredient'),
+    }
+
+    def _related_by_recipe(self, through, field, recipe_ids, expand):
+        """
+        Group `{id, name}` rows, or ids when not expanded, of a M2M
+        relation by recipe id
+        """
+        related = {recipe_id: [] for recipe_id in recipe_ids}
+        rows = through.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).order_by(f'{field}_id')
+        if not expand:
+            for recipe_id, related_id in rows.values_list(
+                'recipe_id',
+                f'{field}_id',
+            ):
+                related[recipe_id].append(related_id)
+            return related
+
+        for recipe_id, related_id, name in rows.values_list(
+            'recipe_id',
+            f'{field}_id',
+            f'{field}__name',
+        ):
+            related[recipe_id].append({'id': related_id, 'name': name})
+
+        return related
+
+    def to_representation(self, data):
+        """ Serialize all rows with one query per selected relation """
+        rows = list(data)
+        if not rows:
+            return []
+
+        recipe_ids = [row['id'] for row in rows]
+        expand = self.child.get_expand()
+        related = {
+            name: self._related_by_recipe(
+                through,
+                field,
+                recipe_ids,
+                name in expand,
+            )
+            for name, (through, field) in self.related_fields.items()
+            if name in self.child.get_output_fields()
+        }
+
+        return [
+            self.child.to_representation(
+                row,
+                {
+                    name: items[row['id']]
+                    for name, items in related.items()
+                },
+            )
+            for row in rows
+        ]
+
+
+class RecipeListSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer for recipe lists built from `.values()` rows.
+
+    Emits the same output as `RecipeSerializer` without building model
+    instances or running field machinery on plain columns. The `fields`
+    and `expand` context select fields as `RecipeSerializer` does.
+    """
+    columns = [
+        'id',
+        'title',
+        'time_minutes',
+        'price',
+        'link',
+        'image',
+        'image_variants',
+        'image_status',
+    ]
+
+    class Meta:
+        list_serializer_class = RecipeValuesListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_model_field = Recipe._meta.get_field('image')
+        self.price_field = serializers.DecimalField(
+            max_digits=5,
+            decimal_places=2,
+        )
+        self.price_field.bind('price', self)
+        self.image_field = serializers.ImageField()
+        self.image_field.bind('image', self)
+        self._output_fields = None
+
+    def get_output_fields(self):
+        """ Return names of the selected fields, in output order """
+        if self._output_fields is None:
+            selected = self.context.get('fields')
+            self._output_fields = [
+                name for name in RecipeSerializer.Meta.fields
+                if selected is None or name in selected
+            ]
+
+        return self._output_fields
+
+    def get_expand(self):
+        """ Return names of the relations rendered as objects """
+        if self.context.get('fields') is None:
+            return set(RecipeSerializer.related_fields)
+
+        return set(self.context.get('expand', ()))
+
+    def _image_representation(self, name):
+        """ Serialize an image path as the image URL """
+        image = self.image_model_field.attr_class(
+            None,
+            self.image_model_field,
+            name,
+        )
+
+        return self.image_field.to_representation(image)
+
+    def to_representation(self, row, related=None):
+        """ Serialize the selected fields of a `.values()` row of a recipe """
+        related = related or {}
+        representation = {}
+        for name in self.get_output_fields():
+            if name == 'price':
+                value = self.price_field.to_representation(row['price'])
+            elif name == 'image':
+                value = self._image_representation(row['image'])
+            elif name == 'image_variants':
+                value = image_variant_urls(
+                    row['image'],
+                    row['image_variants'],
+                    self.context.get('request'),
+                )
+            elif name in RecipeSerializer.related_fields:
+                value = list(related.get(name, ()))
+            else:
+                value = row[name]
+            representation[name] = value
+
+        return representation
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """ Serializer for upload image to recipe """
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants', 'image_status']
         read_only_fields = ['id']
         extra_kwargs = {
             'image': {
                 'required': 'True',
             }
         }
+
+    def update(self, instance, validated_data):
+        """ Store the image by content hash, then generate its variants """
+        digest, name = store_image(validated_data['image'])
+        keys = generate_variants(name, get_variant_keys())
+        set_recipe_image(instance, digest, name, keys)
+
+        return instance
+
+    get_image_variants = RecipeSerializer.get_image_variants
+
+
+class RecipeImageUploadSerializer(RecipeImageSerializer):
+    """
+    Serializer queueing an uploaded recipe image for the image workers,
+    which validate and re-encode it
+    """
+    image = serializers.FileField()
+
+    def update(self, instance, validated_data):
+        """ Spool the image and mark the recipe image as processing """
+        enqueue_image(instance, validated_data['image'])
+
+        return instance
+
+
+class RecipeBulkDeleteSerializer(serializers.Serializer):
+    """ Serializer for deleting many recipes by id """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_MAX_SIZE,
+    )
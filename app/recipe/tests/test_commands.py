@@ -0,0 +1,616 @@
+"""
+Tests for recipe management commands
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from unittest.mock import patch
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.models import (
+    ImageBlob,
+    ImportCheckpoint,
+    Ingredient,
+    Recipe,
+    Tag,
+)
+from recipe.images import (
+    generate_variants,
+    get_variant_keys,
+    set_recipe_image,
+    store_image,
+    variant_name,
+)
+from recipe.media import (
+    delete_unreferenced,
+    iter_unreferenced_files,
+)
+from recipe.imports import import_batch
+
+
+class ExportRecipesCommandTests(TestCase):
+    """ Tests for export_recipes command """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=22,
+            price=Decimal('5.25'),
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'recipes.jsonl.gz')
+
+    def test_export_recipes_to_gzip_file(self):
+        """ Test exporting a user collection to a gzip file """
+        call_command(
+            'export_recipes',
+            self.user.email,
+            output=self.output,
+            gzip=True,
+            stderr=io.StringIO(),
+        )
+
+        with gzip.open(self.output) as output:
+            records = [json.loads(line) for line in output]
+        self.assertEqual([r['type'] for r in records], ['tag', 'recipe'])
+        self.assertEqual(records[1]['tags'], ['Vegan'])
+        self.assertEqual(records[1]['price'], '5.25')
+
+    def test_export_recipes_unknown_user(self):
+        """ Test exporting an unknown user fails """
+        with self.assertRaises(CommandError):
+            call_command('export_recipes', 'unknown@example.com')
+
+
+class ImportRecipesCommandTests(TestCase):
+    """ Tests for import_recipes command """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_file(self, name, content):
+        """ Write a file to import and return its path """
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+        return path
+
+    def call_import(self, path, **options):
+        """ Run the import command and return its output """
+        stdout = io.StringIO()
+        call_command(
+            'import_recipes',
+            self.user.email,
+            path,
+            stdout=stdout,
+            stderr=io.StringIO(),
+            **options,
+        )
+
+        return stdout.getvalue()
+
+    def test_import_exported_recipes(self):
+        """ Test importing a gzipped export into another account """
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        recipe = Recipe.objects.create(
+            user=other,
+            title='Soup',
+            description='Hot',
+            time_minutes=10,
+            price=Decimal('5.25'),
+            link='https://example.com',
+        )
+        recipe.tags.add(Tag.objects.create(user=other, name='Vegan'))
+        recipe.ingredients.add(Ingredient.objects.create(
+            user=other,
+            name='Salt',
+        ))
+        Tag.objects.create(user=other, name='Unused')
+        path = os.path.join(self.directory, 'recipes.jsonl.gz')
+        call_command(
+            'export_recipes',
+            other.email,
+            output=path,
+            gzip=True,
+            stderr=io.StringIO(),
+        )
+
+        self.call_import(path)
+
+        imported = Recipe.objects.get(user=self.user)
+        self.assertEqual(imported.title, 'Soup')
+        self.assertEqual(imported.description, 'Hot')
+        self.assertEqual(imported.price, Decimal('5.25'))
+        self.assertEqual(imported.link, 'https://example.com')
+        self.assertEqual(
+            [tag.name for tag in imported.tags.all()],
+            ['Vegan'],
+        )
+        self.assertEqual(imported.ingredients.get().name, 'Salt')
+        self.assertTrue(
+            Tag.objects.filter(user=self.user, name='Unused').exists(),
+        )
+
+    def test_import_csv_reuses_existing_tags(self):
+        """ Test CSV rows link existing tags without duplicating them """
+        tag = Tag.objects.create(user=self.user, name='Quick|Easy')
+        path = self.write_file('recipes.csv', (
+            'title,time_minutes,price,tags,ingredients\n'
+            'Soup,10,5.25,Quick\\|Easy|Vegan,Salt\n'
+            'Salad,5,2,Vegan,\n'
+        ))
+
+        self.call_import(path)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r.title for r in recipes], ['Soup', 'Salad'])
+        self.assertEqual(
+            sorted(t.name for t in recipes[0].tags.all()),
+            ['Quick|Easy', 'Vegan'],
+        )
+        self.assertIn(tag, recipes[0].tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(recipes[1].tags.get().name, 'Vegan')
+
+    def test_import_api_csv_with_image(self):
+        """ Test CSV recipe lists of the API import with their images """
+        name = 'uploads/recipe/ab/cd/abcd.jpg'
+        ImageBlob.objects.create(digest='abcd', name=name, references=1)
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        Recipe.objects.create(
+            user=other,
+            title='Soup',
+            time_minutes=10,
+            price=Decimal('5.25'),
+            image=name,
+            image_variants=['16.jpeg'],
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        res = client.get(reverse('recipe:recipe-list'), {'format': 'csv'})
+        path = self.write_file(
+            'recipes.csv',
+            b''.join(res.streaming_content).decode(),
+        )
+
+        output = self.call_import(path)
+
+        self.assertIn('skipped 0', output)
+        imported = Recipe.objects.get(user=self.user)
+        self.assertEqual(imported.image.name, name)
+        self.assertEqual(ImageBlob.objects.get().references, 2)
+
+        imported.delete()
+
+        self.assertEqual(ImageBlob.objects.get().references, 1)
+
+    def test_import_skips_invalid_records(self):
+        """ Test invalid records are reported and skipped """
+        path = self.write_file('recipes.jsonl', (
+            '{"title": "Soup", "time_minutes": 10, "price": "1.00"}\n'
+            '{"title": "", "time_minutes": 10, "price": "1.00"}\n'
+            '{"title": "Cake", "time_minutes": 10, "price": "1000"}\n'
+            'not json\n'
+        ))
+
+        output = self.call_import(path)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertIn('skipped 3', output)
+
+    def test_import_resumes_from_checkpoint(self):
+        """ Test a failed import resumes after the last committed batch """
+        path = self.write_file('recipes.jsonl', ''.join(
+            f'{{"title": "Recipe {i}", "time_minutes": 1, "price": 1}}\n'
+            for i in range(5)
+        ))
+        calls = []
+
+        def failing_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('Connection lost')
+            import_batch(*args)
+
+        with patch(
+            'recipe.management.commands.import_recipes.import_batch',
+            side_effect=failing_batch,
+        ):
+            with self.assertRaises(RuntimeError):
+                self.call_import(path, batch_size=2)
+
+        self.assertEqual(ImportCheckpoint.objects.get().position, 2)
+        output = self.call_import(path, batch_size=2)
+
+        self.assertIn('Resuming after record 2', output)
+        self.assertEqual(
+            list(Recipe.objects.filter(user=self.user).order_by(
+                'id',
+            ).values_list('title', flat=True)),
+            [f'Recipe {i}' for i in range(5)],
+        )
+
+
+class ShardRecipeImagesCommandTests(TestCase):
+    """ Tests for shard_recipe_images command """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media.name,
+            RECIPE_IMAGE_VARIANT_SIZES=[16],
+            RECIPE_IMAGE_VARIANT_FORMATS=['jpeg'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+
+    def create_recipe(self, image, variants=()):
+        """ Create a recipe with an image of the flat layout """
+        for name in (image, *(variant_name(image, k) for k in variants)):
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(b'image'))
+
+        return Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+            image=image,
+            image_variants=list(variants),
+        )
+
+    def call_shard(self, **options):
+        """ Run the command and return its output """
+        stdout = io.StringIO()
+        call_command('shard_recipe_images', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_shard_recipe_images(self):
+        """ Test flat images and variants move to sharded paths """
+        shared = 'uploads/recipe/abcdef.jpg'
+        first = self.create_recipe(shared, ['16.jpeg'])
+        second = self.create_recipe(shared, ['16.jpeg'])
+        other = self.create_recipe('uploads/recipe/123456.png')
+        ImageBlob.objects.create(digest='abcdef', name=shared, references=2)
+
+        output = self.call_shard(batch_size=1)
+
+        self.assertIn('Moved 2 images', output)
+        for recipe in (first, second):
+            recipe.refresh_from_db()
+            self.assertEqual(
+                recipe.image.name,
+                'uploads/recipe/ab/cd/abcdef.jpg',
+            )
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, 'uploads/recipe/12/34/123456.png')
+        self.assertTrue(default_storage.exists(first.image.name))
+        self.assertTrue(default_storage.exists(
+            'uploads/recipe/ab/cd/abcdef_16.jpeg'
+        ))
+        self.assertFalse(default_storage.exists(shared))
+        self.assertFalse(
+            default_storage.exists('uploads/recipe/abcdef_16.jpeg')
+        )
+        self.assertEqual(ImageBlob.objects.get().name, first.image.name)
+        self.assertEqual(ImportCheckpoint.objects.get().position, other.id)
+
+    def test_shard_resumes_from_checkpoint(self):
+        """ Test recipes before the checkpoint are not scanned again """
+        skipped = self.create_recipe('uploads/recipe/aaaa.jpg')
+        migrated = self.create_recipe('uploads/recipe/bbbb.jpg')
+        ImportCheckpoint.objects.create(
+            name='shard-recipe-images',
+            position=skipped.id,
+        )
+
+        output = self.call_shard()
+
+        self.assertIn(f'Resuming after recipe {skipped.id}', output)
+        skipped.refresh_from_db()
+        migrated.refresh_from_db()
+        self.assertEqual(skipped.image.name, 'uploads/recipe/aaaa.jpg')
+        self.assertEqual(migrated.image.name, 'uploads/recipe/bb/bb/bbbb.jpg')
+
+    def test_shard_skips_missing_files(self):
+        """ Test recipes whose image is missing on disk keep their path """
+        recipe = self.create_recipe('uploads/recipe/cccc.jpg')
+        default_storage.delete(recipe.image.name)
+
+        self.call_shard()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'uploads/recipe/cccc.jpg')
+
+
+class CollectImageGarbageCommandTests(TestCase):
+    """ Tests for collect_image_garbage command """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media.name,
+            RECIPE_IMAGE_VARIANT_SIZES=[16],
+            RECIPE_IMAGE_VARIANT_FORMATS=['jpeg'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        self.referenced = [
+            'uploads/recipe/ab/cd/abcd.jpg',
+            'uploads/recipe/ab/cd/abcd_16.jpeg',
+            'uploads/recipe/ab/cd/abcd_64.webp',
+            'uploads/recipe/12/34/1234.png',
+            'uploads/recipe/12/34/1234_16.jpeg',
+        ]
+        self.unreferenced = [
+            'uploads/recipe/ab.jpg',
+            'uploads/recipe/ab/cd/abcd_16.webp',
+            'uploads/recipe/ab/cd/abcd.png',
+            'uploads/recipe/56/78/5678.png',
+        ]
+        for name in self.referenced + self.unreferenced:
+            self.create_file(name, age=7200)
+        self.recent = self.create_file('uploads/recipe/ef/01/ef01.jpg')
+        Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+            image='uploads/recipe/ab/cd/abcd.jpg',
+            image_variants=['16.jpeg', '64.webp'],
+        )
+        ImageBlob.objects.create(
+            digest='1234',
+            name='uploads/recipe/12/34/1234.png',
+            references=1,
+        )
+        ImageBlob.objects.create(
+            digest='5678',
+            name='uploads/recipe/56/78/5678.png',
+            references=0,
+        )
+
+    def create_file(self, name, age=0):
+        """ Write a media file last modified `age` seconds ago """
+        default_storage.save(name, ContentFile(b'image'))
+        modified = time.time() - age
+        os.utime(default_storage.path(name), (modified, modified))
+        return name
+
+    def call_gc(self, **options):
+        """ Run the command and return the listed files and summary """
+        stdout = io.StringIO()
+        call_command(
+            'collect_image_garbage',
+            grace=3600,
+            stdout=stdout,
+            **options,
+        )
+        *names, summary = stdout.getvalue().splitlines()
+        return names, summary
+
+    def test_dry_run_reports_unreferenced_files(self):
+        """ Test a dry run lists old unreferenced files and keeps them """
+        names, summary = self.call_gc(dry_run=True)
+
+        self.assertEqual(sorted(names), sorted(self.unreferenced))
+        self.assertEqual(summary, 'Would delete 4 files (20 bytes)')
+        for name in self.unreferenced:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_collect_image_garbage(self):
+        """ Test old unreferenced files and unused stored images go """
+        names, summary = self.call_gc(chunk_size=1)
+
+        self.assertEqual(sorted(names), sorted(self.unreferenced))
+        self.assertEqual(summary, 'Deleted 4 files (20 bytes)')
+        for name in self.unreferenced:
+            self.assertFalse(default_storage.exists(name))
+        for name in [*self.referenced, self.recent]:
+            self.assertTrue(default_storage.exists(name))
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('digest', flat=True)),
+            ['1234'],
+        )
+
+    def test_variants_of_reused_images_kept(self):
+        """ Test variants reused by an upload during collection are kept """
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 40)).save(buffer, format='JPEG')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        digest, name = store_image(SimpleUploadedFile(
+            'a.jpg',
+            buffer.getvalue(),
+        ))
+        set_recipe_image(recipe, digest, name, generate_variants(
+            name,
+            get_variant_keys(),
+        ))
+        files = [name, variant_name(name, '16.jpeg')]
+        recipe.delete()
+        for file in files:
+            os.utime(default_storage.path(file), (0, 0))
+        candidates = [
+            file for file, _ in iter_unreferenced_files(
+                default_storage,
+                3600,
+                100,
+            )
+        ]
+        self.assertTrue(set(files) <= set(candidates))
+
+        # The same bytes are uploaded again while collecting
+        other = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        digest, name = store_image(SimpleUploadedFile(
+            'b.jpg',
+            buffer.getvalue(),
+        ))
+        keys = generate_variants(name, get_variant_keys())
+        set_recipe_image(other, digest, name, keys)
+        for file in files:
+            self.assertGreater(os.stat(default_storage.path(file)).st_mtime, 0)
+            # Checked through the image reference, whatever the file age
+            os.utime(default_storage.path(file), (0, 0))
+        deleted = delete_unreferenced(default_storage, candidates, 3600)
+
+        self.assertFalse(set(files) & set(deleted))
+        for file in files:
+            self.assertTrue(default_storage.exists(file))
+
+    def test_reused_images_kept(self):
+        """ Test files referenced since the scan are not deleted """
+        with patch(
+            'recipe.management.commands.collect_image_garbage.'
+            'iter_unreferenced_files',
+            return_value=iter([('uploads/recipe/56/78/5678.png', 5)]),
+        ):
+            ImageBlob.objects.filter(digest='5678').update(references=1)
+            names, summary = self.call_gc()
+
+        self.assertEqual(names, [])
+        self.assertTrue(
+            default_storage.exists('uploads/recipe/56/78/5678.png')
+        )
+
+
+class GenerateImageVariantsCommandTests(TestCase):
+    """ Tests for generate_image_variants command """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media.name,
+            RECIPE_IMAGE_VARIANT_SIZES=[16, 32],
+            RECIPE_IMAGE_VARIANT_FORMATS=['jpeg'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+
+    def create_recipe(self, image, content, variants=()):
+        """ Create a recipe with an image and recorded variants """
+        default_storage.save(image, ContentFile(content))
+
+        return Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+            image=image,
+            image_variants=list(variants),
+        )
+
+    def jpeg_bytes(self):
+        """ Return the bytes of a JPEG image """
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 40)).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def call_generate(self):
+        """ Run the command and return its summary """
+        stdout = io.StringIO()
+        call_command(
+            'generate_image_variants',
+            stdout=stdout,
+            stderr=io.StringIO(),
+        )
+        return stdout.getvalue().strip()
+
+    def test_generate_missing_variants(self):
+        """ Test newly configured variants are generated and recorded """
+        recipe = self.create_recipe(
+            'uploads/recipe/ab/cd/abcd.jpg',
+            self.jpeg_bytes(),
+            variants=['16.jpeg'],
+        )
+        complete = self.create_recipe(
+            'uploads/recipe/12/34/1234.jpg',
+            self.jpeg_bytes(),
+            variants=['16.jpeg', '32.jpeg'],
+        )
+
+        summary = self.call_generate()
+
+        self.assertEqual(summary, 'Generated variants of 1 images, 0 failed')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, ['16.jpeg', '32.jpeg'])
+        self.assertTrue(default_storage.exists(
+            variant_name(recipe.image.name, '32.jpeg')
+        ))
+        updated_at = complete.updated_at
+        complete.refresh_from_db()
+        self.assertEqual(complete.updated_at, updated_at)
+
+    def test_unreadable_image_failed_once(self):
+        """ Test unreadable images are marked failed and not retried """
+        recipe = self.create_recipe('uploads/recipe/ab/cd/abcd.jpg', b'bad')
+
+        summary = self.call_generate()
+
+        self.assertEqual(summary, 'Generated variants of 0 images, 1 failed')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.FAILED)
+        self.assertEqual(recipe.image_variants, [])
+
+        summary = self.call_generate()
+
+        self.assertEqual(summary, 'Generated variants of 0 images, 0 failed')
@@ -0,0 +1,154 @@
+"""
+Tests for the recipe media endpoint
+"""
+import tempfile
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe
+
+IMAGE_NAME = 'uploads/recipe/ab/cd/abcd.jpg'
+
+
+def media_url(name):
+    """ Create and return a media URL """
+    return reverse('media', args=[name])
+
+
+def create_recipe(user, **params):
+    """ Create and return a recipe """
+    return Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=5,
+        price=Decimal('1.00'),
+        **params,
+    )
+
+
+class PublicMediaApiTests(TestCase):
+    """ Test unauthenticated media requests """
+
+    def test_auth_required(self):
+        """ Test media requires authentication """
+        res = APIClient().get(media_url(IMAGE_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('X-Accel-Redirect', res)
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+class PrivateMediaApiTests(TestCase):
+    """ Test authenticated media requests """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(
+            self.user,
+            image=IMAGE_NAME,
+            image_variants=['128.webp'],
+        )
+
+    def test_image_redirected_to_nginx(self):
+        """ Test owned images are handed to nginx """
+        res = self.client.get(media_url(IMAGE_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected-media/{IMAGE_NAME}',
+        )
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertIn('private', res['Cache-Control'])
+        self.assertEqual(res.content, b'')
+
+    def test_variant_redirected_to_nginx(self):
+        """ Test generated variants of owned images are handed to nginx """
+        name = 'uploads/recipe/ab/cd/abcd_128.webp'
+
+        res = self.client.get(media_url(name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(res['Content-Type'], 'image/webp')
+
+    def test_image_of_other_user_not_found(self):
+        """ Test images of recipes of other users are not sent """
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        create_recipe(other, image='uploads/recipe/ef/01/ef01.jpg')
+
+        res = self.client.get(media_url('uploads/recipe/ef/01/ef01.jpg'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('X-Accel-Redirect', res)
+
+    def test_shared_image_sent_to_each_owner(self):
+        """ Test identical images stored once are sent to every owner """
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        create_recipe(other, image=IMAGE_NAME)
+        self.client.force_authenticate(other)
+
+        res = self.client.get(media_url(IMAGE_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unrecorded_variant_not_found(self):
+        """ Test variants not generated for the recipe are not sent """
+        res = self.client.get(media_url('uploads/recipe/ab/cd/abcd_16.webp'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_path_traversal_not_found(self):
+        """ Test names leaving the media directory are rejected """
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image='uploads/../../etc/passwd',
+        )
+
+        res = self.client.get(media_url('uploads/../../etc/passwd'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_media_url_points_to_endpoint(self):
+        """ Test recipe image URLs use the media endpoint """
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+        )
+
+        self.assertEqual(
+            res.data['image'],
+            f'http://testserver{media_url(IMAGE_NAME)}',
+        )
+
+    def test_file_sent_without_accel_redirect(self):
+        """ Test files are sent by Django without a redirect prefix """
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media,
+            MEDIA_ACCEL_REDIRECT_PREFIX='',
+        ):
+            default_storage.save(IMAGE_NAME, ContentFile(b'image'))
+
+            res = self.client.get(media_url(IMAGE_NAME))
+            content = b''.join(res.streaming_content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Accel-Redirect', res)
+        self.assertEqual(content, b'image')
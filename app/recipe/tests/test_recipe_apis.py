@@ -2,25 +2,55 @@
 Tests for recipe APIs
 """
 from decimal import Decimal
+import csv
+import gzip
+import hashlib
+import io
+import json
 import tempfile
 import os
+import shutil
+from unittest.mock import (
+    patch,
+    ANY,
+)
+import msgpack
 from PIL import Image
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import caches
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Prefetch
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from core.models import (
+    ImageBlob,
+    ImageJob,
     Recipe,
     Tag,
     Ingredient,
+    recipe_image_content_path,
 )
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
 )
+from recipe.pagination import RecipeCursorPagination
+from recipe.images import variant_name
+from common.cache import CACHE_ALIAS
 
 RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk-create')
+RECIPES_EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def detail_url(recipe_id):
@@ -66,6 +96,7 @@ class PublicRecipeApisTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+@override_settings(RESPONSE_CACHE_ENABLED=True)
 class PrivateRecipeApisTests(TestCase):
     """ Test for authenticated recipe APIs """
 
@@ -527,6 +558,921 @@ class PrivateRecipeApisTests(TestCase):
         self.assertIn(recipe_serializer_2.data, res.data)
         self.assertNotIn(recipe_serializer_3.data, res.data)
 
+    def test_list_recipes_with_cursor_pagination(self):
+        """ Test list recipes page by page with a cursor """
+        recipes = [
+            create_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipes[4].id, recipes[3].id],
+        )
+        self.assertIsNone(res.data['previous'])
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipes[2].id, recipes[1].id],
+        )
+        self.assertIsNotNone(res.data['previous'])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipes[0].id],
+        )
+        self.assertIsNone(res.data['next'])
+
+    def test_list_recipes_page_size_is_capped(self):
+        """ Test requested page size is limited by the server maximum """
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+
+        with patch.object(RecipeCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPES_URL, {'page_size': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_list_recipes_query_count(self):
+        """ Test listing recipes loads relations in constant queries """
+        tag = Tag.objects.create(name='Tag 1', user=self.user)
+        ingredient = Ingredient.objects.create(
+            name='Ingredient 1',
+            user=self.user,
+        )
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        # Validator aggregates, then recipes, tags and ingredients
+        with self.assertNumQueries(6):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
+    def test_get_recipe_detail_query_count(self):
+        """ Test recipe detail loads relations in constant queries """
+        recipe = create_recipe(user=self.user)
+        for i in range(3):
+            recipe.tags.add(
+                Tag.objects.create(name=f'Tag {i}', user=self.user)
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(
+                    name=f'Ingredient {i}',
+                    user=self.user,
+                )
+            )
+
+        # Validator aggregates, then recipe, tags and ingredients
+        with self.assertNumQueries(6):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 3)
+        self.assertEqual(len(res.data['ingredients']), 3)
+
+    def test_filter_by_tags_match_all(self):
+        """ Test retrieve recipes having all of the given tags """
+        recipe_1 = create_recipe(user=self.user, title='Recipe 1')
+        recipe_2 = create_recipe(user=self.user, title='Recipe 2')
+        tag_1 = Tag.objects.create(name="Tag 1", user=self.user)
+        tag_2 = Tag.objects.create(name="Tag 2", user=self.user)
+        recipe_1.tags.add(tag_1, tag_2)
+        recipe_2.tags.add(tag_1)
+
+        params = {
+            'tags': f"{tag_1.id},{tag_2.id}",
+            'match': 'all',
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe_1.id])
+
+    def test_filter_by_ingredients_match_all(self):
+        """ Test retrieve recipes having all of the given ingredients """
+        recipe_1 = create_recipe(user=self.user, title='Recipe 1')
+        recipe_2 = create_recipe(user=self.user, title='Recipe 2')
+        ingredient_1 = Ingredient.objects.create(
+            name="Ingredient 1",
+            user=self.user,
+        )
+        ingredient_2 = Ingredient.objects.create(
+            name="Ingredient 2",
+            user=self.user,
+        )
+        recipe_1.ingredients.add(ingredient_1)
+        recipe_2.ingredients.add(ingredient_1, ingredient_2)
+
+        params = {
+            'ingredients': f"{ingredient_1.id},{ingredient_2.id}",
+            'match': 'all',
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe_2.id])
+
+    def test_filter_by_tags_no_duplicates(self):
+        """ Test recipes matching several tags are returned once """
+        recipe = create_recipe(user=self.user)
+        tag_1 = Tag.objects.create(name="Tag 1", user=self.user)
+        tag_2 = Tag.objects.create(name="Tag 2", user=self.user)
+        recipe.tags.add(tag_1, tag_2)
+
+        params = {
+            'tags': f"{tag_1.id},{tag_2.id}",
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe.id])
+
+    def test_list_serializer_matches_recipe_serializer(self):
+        """ Test fast list output is byte-identical to RecipeSerializer """
+        tag_1 = Tag.objects.create(name='Tag 1', user=self.user)
+        tag_2 = Tag.objects.create(name='Tag 2', user=self.user)
+        ingredient = Ingredient.objects.create(
+            name='Ingredient 1',
+            user=self.user,
+        )
+        recipe_1 = create_recipe(user=self.user, price=Decimal('3.10'))
+        recipe_1.tags.add(tag_2, tag_1)
+        recipe_1.ingredients.add(ingredient)
+        recipe_2 = create_recipe(user=self.user, title='Recipe 2')
+        recipe_2.image = 'uploads/recipe/sample.jpg'
+        recipe_2.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipes = Recipe.objects.filter(user=self.user).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.order_by('id'),
+            ),
+        ).order_by('-id')
+        serializer = RecipeSerializer(
+            recipes,
+            many=True,
+            context={'request': res.wsgi_request},
+        )
+        self.assertEqual(res.content, JSONRenderer().render(serializer.data))
+
+    def test_create_recipe_with_duplicated_tags(self):
+        """ Test duplicated tag names are stored once """
+        Tag.objects.create(name='Tag 1', user=self.user)
+        payload = {
+            'title': 'Sample recipe title',
+            'time_minutes': 20,
+            'price': Decimal('5.25'),
+            'tags': [
+                {'name': 'Tag 1'},
+                {'name': 'Tag 2'},
+                {'name': 'Tag 2'},
+            ],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_create_recipe_query_count_independent_of_tags(self):
+        """ Test creating a recipe resolves tags in bulk """
+        payload = {
+            'title': 'Sample recipe title',
+            'time_minutes': 20,
+            'price': Decimal('5.25'),
+            'tags': [{'name': f'Tag {i}'} for i in range(10)],
+            'ingredients': [{'name': f'Ingredient {i}'} for i in range(10)],
+        }
+
+        # Savepoint, recipe insert, insert/select/link per relation,
+        # savepoint release and one read per relation for the response
+        with self.assertNumQueries(11):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 10)
+        self.assertEqual(recipe.ingredients.count(), 10)
+
+    def test_update_recipe_keeps_unchanged_tag_links(self):
+        """ Test resending tags only writes the changed links """
+        tag_1 = Tag.objects.create(name='Tag 1', user=self.user)
+        tag_2 = Tag.objects.create(name='Tag 2', user=self.user)
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag_1, tag_2)
+        link = Recipe.tags.through.objects.get(recipe=recipe, tag=tag_1)
+
+        payload = {
+            'tags': [{'name': 'Tag 1'}, {'name': 'Tag 3'}],
+        }
+        url = detail_url(recipe.id)
+        res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            Recipe.tags.through.objects.filter(id=link.id).exists()
+        )
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Tag 1', 'Tag 3'},
+        )
+
+    def test_partial_update_saves_changed_fields_only(self):
+        """ Test partial update only writes changed columns """
+        recipe = create_recipe(user=self.user)
+
+        payload = {
+            'title': 'Updated recipe title',
+            'link': recipe.link,
+        }
+        url = detail_url(recipe.id)
+        with patch.object(Recipe, 'save', autospec=True) as mock_save:
+            res = self.client.patch(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        mock_save.assert_called_once_with(
+            ANY,
+            update_fields=['title', 'updated_at'],
+        )
+
+    def test_bulk_create_recipes(self):
+        """ Test create many recipes in one request """
+        Tag.objects.create(name='Tag 1', user=self.user)
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': '2.50',
+                'tags': [{'name': 'Tag 1'}, {'name': f'Tag {i + 2}'}],
+                'ingredients': [{'name': 'Ingredient 1'}],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item['title'] for item in res.data],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2'],
+        )
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        for recipe in recipes:
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_bulk_create_invalid_item_creates_nothing(self):
+        """ Test one invalid item rejects the whole batch """
+        payload = [
+            {'title': 'Recipe 1', 'time_minutes': 10, 'price': '2.50'},
+            {'title': 'Recipe 2', 'price': '2.50'},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_minutes', res.data[1])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    @override_settings(RECIPE_BULK_MAX_SIZE=2)
+    def test_bulk_create_batch_size_limit(self):
+        """ Test bulk requests above the maximum batch size fail """
+        payload = [
+            {'title': 'Recipe', 'time_minutes': 10, 'price': '2.50'}
+        ] * 3
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_update_recipes(self):
+        """ Test partially update many recipes in one request """
+        tag_1 = Tag.objects.create(name='Tag 1', user=self.user)
+        recipe_1 = create_recipe(user=self.user, title='Recipe 1')
+        recipe_1.tags.add(tag_1)
+        recipe_2 = create_recipe(user=self.user, title='Recipe 2')
+
+        payload = [
+            {'id': recipe_2.id, 'tags': [{'name': 'Tag 2'}]},
+            {'id': recipe_1.id, 'title': 'Updated', 'tags': []},
+        ]
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [recipe_2.id, recipe_1.id],
+        )
+        recipe_1.refresh_from_db()
+        recipe_2.refresh_from_db()
+        self.assertEqual(recipe_1.title, 'Updated')
+        self.assertEqual(recipe_1.tags.count(), 0)
+        self.assertEqual(recipe_2.title, 'Recipe 2')
+        self.assertEqual(
+            list(recipe_2.tags.values_list('name', flat=True)),
+            ['Tag 2'],
+        )
+
+    def test_bulk_update_other_users_recipe_error(self):
+        """ Test bulk update rejects recipes of other users """
+        other_user = create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        recipe = create_recipe(user=self.user)
+        other_recipe = create_recipe(user=other_user)
+
+        payload = [
+            {'id': recipe.id, 'title': 'Updated'},
+            {'id': other_recipe.id, 'title': 'Updated'},
+        ]
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.title, 'Updated')
+
+    def test_bulk_update_invalid_id_error(self):
+        """ Test bulk update rejects ids which are not integers """
+        recipe = create_recipe(user=self.user)
+
+        payload = [
+            {'id': recipe.id, 'title': 'Updated'},
+            {'id': [recipe.id], 'title': 'Updated'},
+            {'id': {'a': 1}, 'title': 'Updated'},
+            {'id': True, 'title': 'Updated'},
+        ]
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        for error in res.data[1:]:
+            self.assertIn('id', error)
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.title, 'Updated')
+
+    def test_bulk_delete_recipes(self):
+        """ Test delete many recipes in one request """
+        recipe_1 = create_recipe(user=self.user)
+        recipe_2 = create_recipe(user=self.user)
+        recipe_3 = create_recipe(user=self.user)
+
+        payload = {'ids': [recipe_1.id, recipe_2.id]}
+        res = self.client.delete(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            [
+                {'id': recipe_1.id, 'deleted': True},
+                {'id': recipe_2.id, 'deleted': True},
+            ],
+        )
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True)),
+            [recipe_3.id],
+        )
+
+    def test_bulk_delete_missing_recipe_deletes_nothing(self):
+        """ Test bulk delete with an unknown id deletes nothing """
+        other_user = create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        recipe = create_recipe(user=self.user)
+        other_recipe = create_recipe(user=other_user)
+
+        payload = {'ids': [recipe.id, other_recipe.id]}
+        res = self.client.delete(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(1, res.data['ids'])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_search_recipes(self):
+        """ Test full-text search ranks title matches first """
+        recipe_1 = create_recipe(
+            user=self.user,
+            title='Chicken curry',
+            description='Spicy dinner',
+        )
+        recipe_2 = create_recipe(
+            user=self.user,
+            title='Fried rice',
+            description='Leftover chicken with rice',
+        )
+        create_recipe(
+            user=self.user,
+            title='Pancakes',
+            description='Sweet breakfast',
+        )
+
+        res = self.client.get(RECIPES_URL, {'search': 'chicken'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [recipe_1.id, recipe_2.id],
+        )
+
+    def test_search_recipes_with_tags_filter(self):
+        """ Test full-text search combines with tag filters """
+        tag = Tag.objects.create(name='Dinner', user=self.user)
+        recipe_1 = create_recipe(user=self.user, title='Chicken curry')
+        recipe_1.tags.add(tag)
+        create_recipe(user=self.user, title='Chicken soup')
+
+        params = {'search': 'chicken', 'tags': str(tag.id)}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe_1.id])
+
+    def test_search_recipes_with_cursor_pagination(self):
+        """ Test search results can be paged with a cursor """
+        recipes = [
+            create_recipe(user=self.user, title=f'Chicken recipe {i}')
+            for i in range(3)
+        ]
+
+        params = {'search': 'chicken', 'page_size': 2}
+        res = self.client.get(RECIPES_URL, params)
+        next_res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in res.data['results']]
+        ids += [item['id'] for item in next_res.data['results']]
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+        self.assertIsNone(next_res.data['next'])
+
+    def test_search_pages_without_duplicates(self):
+        """ Test paging through ranked search results returns each once """
+        recipes = [
+            create_recipe(
+                user=self.user,
+                title=f'Chicken recipe {i}',
+                description=' '.join(['chicken'] * i + ['rice'] * (7 - i)),
+            )
+            for i in range(7)
+        ]
+
+        ids = []
+        params = {'search': 'chicken', 'page_size': 2}
+        res = self.client.get(RECIPES_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids += [item['id'] for item in res.data['results']]
+            if res.data['next'] is None:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertCountEqual(ids, [recipe.id for recipe in recipes])
+
+    def test_search_reflects_updated_title(self):
+        """ Test search index is updated when a recipe changes """
+        recipe = create_recipe(user=self.user, title='Chicken curry')
+
+        url = detail_url(recipe.id)
+        self.client.patch(url, {'title': 'Beef stew'})
+        res = self.client.get(RECIPES_URL, {'search': 'beef'})
+
+        self.assertEqual([item['id'] for item in res.data], [recipe.id])
+        res = self.client.get(RECIPES_URL, {'search': 'chicken'})
+        self.assertEqual(res.data, [])
+
+    def test_list_recipes_not_modified(self):
+        """ Test unchanged recipe list returns 304 from aggregates only """
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        # One aggregate per recipes, tags and ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_recipes_modified_after_delete(self):
+        """ Test deleting a recipe changes the recipe list ETag """
+        recipe = create_recipe(user=self.user)
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_recipes_modified_after_tag_rename(self):
+        """ Test renaming a tag changes the recipe list ETag """
+        tag = Tag.objects.create(name='Tag 1', user=self.user)
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        tag.name = 'Tag 2'
+        tag.save()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Tag 2')
+
+    def test_get_recipe_detail_not_modified_since(self):
+        """ Test unchanged recipe detail returns 304 for If-Modified-Since """
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        res = self.client.get(url)
+
+        res = self.client.get(
+            url,
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_recipe_detail_modified_after_tags_update(self):
+        """ Test changing recipe tags changes its detail ETag """
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        payload = {'tags': [{'name': 'Tag 1'}]}
+        self.client.patch(url, payload, format='json')
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_list_recipes_served_from_cache(self):
+        """ Test repeated recipe list is served from the response cache """
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        # Only the conditional GET aggregates run
+        with self.assertNumQueries(3):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['Content-Type'], res['Content-Type'])
+        self.assertEqual(cached['ETag'], res['ETag'])
+
+    def test_recipe_cache_key_includes_query(self):
+        """ Test differently filtered recipe lists are cached apart """
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL, {'tags': '1,2'})
+
+        res = self.client.get(RECIPES_URL, {'tags': '2'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+        res = self.client.get(RECIPES_URL, {'tags': '1,2'})
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_recipe_cache_per_user(self):
+        """ Test cached recipe list is not served to another user """
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        other_user = create_user(
+            email='other@example.com',
+            password='12345678',
+        )
+        self.client.force_authenticate(other_user)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data, [])
+
+    def test_recipe_cache_invalidated_on_update(self):
+        """ Test updating a recipe invalidates the cached detail """
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        self.client.get(url)
+
+        self.client.patch(url, {'title': 'New title'})
+        res = self.client.get(url)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_recipe_cache_invalidated_on_bulk_update(self):
+        """ Test bulk updating recipes invalidates the cached list """
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        payload = [{'id': recipe.id, 'title': 'New title'}]
+        self.client.patch(RECIPES_BULK_URL, payload, format='json')
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data[0]['title'], 'New title')
+
+    def test_recipe_cache_invalidated_on_tag_link(self):
+        """ Test linking a tag invalidates the cached recipe list """
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Tag 1'))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data[0]['tags']), 1)
+
+    def test_recipe_cache_invalidated_by_other_process(self):
+        """ Test a write of another process invalidates the shared cache """
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={
+                **settings.CACHES,
+                CACHE_ALIAS: {
+                    # Instances share entries but no memory, like redis
+                    'BACKEND': (
+                        'django.core.cache.backends.filebased.FileBasedCache'
+                    ),
+                    'LOCATION': location,
+                },
+            },
+        ):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+            # Another process holds its own instance of the shared backend
+            other_cache = caches.create_connection(CACHE_ALIAS)
+            with patch('common.cache.get_cache', return_value=other_cache):
+                recipe.title = 'New title'
+                recipe.save()
+            res = self.client.get(url)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'New title')
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_recipe_cache_disabled(self):
+        """ Test responses are not cached when the cache is disabled """
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        self.client.get(url)
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Cache', res)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_expired_recipe_list_served_stale_while_rebuilt(self):
+        """ Test expired recipe list is served while another request locks """
+        recipe = create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+
+        with patch('common.cache.acquire_lock', return_value=False):
+            stale = self.client.get(RECIPES_URL)
+
+        self.assertEqual(stale['X-Cache'], 'STALE')
+        self.assertEqual(stale.content, res.content)
+        self.assertEqual(len(stale.json()), 1)
+        self.assertEqual(stale.json()[0]['id'], recipe.id)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_expired_recipe_list_rebuilt_by_lock_holder(self):
+        """ Test expired recipe list is rebuilt when the lock is free """
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    @override_settings(RESPONSE_CACHE_LOCK_WAIT=0)
+    def test_outdated_recipe_list_not_served_stale(self):
+        """ Test recipe list outdated by a write is never served stale """
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.delete()
+        with patch('common.cache.acquire_lock', return_value=False):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data, [])
+
+    def test_recipe_list_rebuild_releases_lock(self):
+        """ Test rebuilding the recipe list releases its lock """
+        with patch('common.cache.release_lock') as release_lock:
+            self.client.get(RECIPES_URL)
+
+        release_lock.assert_called_once()
+
+    def _create_recipes_for_export(self):
+        """ Create recipes with tags and ingredients to export """
+        tag_1 = Tag.objects.create(name='Vegan', user=self.user)
+        tag_2 = Tag.objects.create(name='Quick|Easy', user=self.user)
+        ingredient = Ingredient.objects.create(name='Salt', user=self.user)
+        recipe = create_recipe(user=self.user, price=Decimal('3.10'))
+        recipe.tags.add(tag_1, tag_2)
+        recipe.ingredients.add(ingredient)
+        create_recipe(user=self.user, title='Recipe, "quoted"')
+
+    def test_list_recipes_csv(self):
+        """ Test recipe list streamed as CSV with flattened relations """
+        self._create_recipes_for_export()
+        expected = self.client.get(RECIPES_URL).data
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['title'], expected[0]['title'])
+        self.assertEqual(rows[1]['price'], '3.10')
+        self.assertEqual(rows[1]['tags'], 'Vegan|Quick\\|Easy')
+        self.assertEqual(rows[1]['ingredients'], 'Salt')
+        self.assertEqual(rows[1]['image'], '')
+
+    @override_settings(RECIPE_STREAM_CHUNK_SIZE=2)
+    def test_list_recipes_csv_query_count(self):
+        """ Test CSV rows are read in chunks with one query per relation """
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'format': 'csv'})
+        # A server-side cursor, then 2 relation queries for each chunk
+        with self.assertNumQueries(5):
+            content = b''.join(res.streaming_content).decode()
+
+        self.assertEqual(len(content.splitlines()), 4)
+
+    def test_list_recipes_csv_empty(self):
+        """ Test an empty CSV recipe list still has its header """
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='text/csv')
+
+        content = b''.join(res.streaming_content).decode()
+        self.assertEqual(
+            content.splitlines(),
+            [','.join(RecipeSerializer.Meta.fields)],
+        )
+
+    def test_list_recipes_msgpack(self):
+        """ Test recipe list rendered as MessagePack matches JSON """
+        self._create_recipes_for_export()
+        expected = self.client.get(RECIPES_URL).json()
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content), expected)
+
+    def test_list_recipes_selected_fields(self):
+        """ Test recipe list returns and reads selected fields only """
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(name='Tag 1', user=self.user))
+
+        # 3 validator aggregates and the recipe columns, no relation query
+        with self.assertNumQueries(4) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'title,id'})
+
+        self.assertEqual(res.data, [{'id': recipe.id, 'title': recipe.title}])
+        self.assertNotIn('price', queries.captured_queries[-1]['sql'])
+
+    def test_list_recipes_unexpanded_relations(self):
+        """ Test selected relations are IDs unless expanded """
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(name='Tag 1', user=self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL, {'fields': 'id,tags'})
+
+        self.assertEqual(res.data, [{'id': recipe.id, 'tags': [tag.id]}])
+        res = self.client.get(
+            RECIPES_URL,
+            {'fields': 'id,tags', 'expand': 'tags'},
+        )
+        self.assertEqual(
+            res.data[0]['tags'],
+            [{'id': tag.id, 'name': 'Tag 1'}],
+        )
+
+    def test_get_recipe_detail_selected_fields(self):
+        """ Test recipe detail defers columns and relations not selected """
+        recipe = create_recipe(user=self.user)
+        ingredient = Ingredient.objects.create(name='Salt', user=self.user)
+        recipe.ingredients.add(ingredient)
+        recipe.tags.add(Tag.objects.create(name='Tag 1', user=self.user))
+
+        # 3 validator aggregates, the recipe and its ingredient ids
+        with self.assertNumQueries(5) as queries:
+            res = self.client.get(
+                detail_url(recipe.id),
+                {'fields': 'description,ingredients'},
+            )
+
+        self.assertEqual(res.data, {
+            'description': recipe.description,
+            'ingredients': [ingredient.id],
+        })
+        self.assertNotIn('"title"', queries.captured_queries[3]['sql'])
+
+    def test_list_recipes_unknown_fields(self):
+        """ Test unknown selected fields return error """
+        res = self.client.get(RECIPES_URL, {'fields': 'id,description'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(RECIPES_URL, {'fields': 'id', 'expand': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_csv_selected_fields(self):
+        """ Test CSV recipe list has selected columns only """
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'fields': 'id,title', 'format': 'csv'},
+        )
+
+        content = b''.join(res.streaming_content).decode()
+        self.assertEqual(
+            content.splitlines(),
+            ['id,title', f'{recipe.id},{recipe.title}'],
+        )
+
+    def test_export_recipes(self):
+        """ Test exporting tags, ingredients and recipes as JSON Lines """
+        self._create_recipes_for_export()
+        other_user = create_user(email='other@example.com', password='pw')
+        create_recipe(user=other_user)
+
+        res = self.client.get(RECIPES_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        content = b''.join(res.streaming_content)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['tag', 'tag', 'ingredient', 'recipe', 'recipe'],
+        )
+        recipe = records[3]
+        self.assertEqual(recipe['price'], '3.10')
+        self.assertEqual(recipe['tags'], ['Vegan', 'Quick|Easy'])
+        self.assertEqual(recipe['ingredients'], ['Salt'])
+        self.assertIsNone(recipe['image'])
+        self.assertEqual(records[4]['title'], 'Recipe, "quoted"')
+
+    @override_settings(RECIPE_STREAM_CHUNK_SIZE=2)
+    def test_export_recipes_gzip(self):
+        """ Test export compressed on the fly reads recipes in chunks """
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_EXPORT_URL, {'compress': 'gzip'})
+        # Tag and ingredient cursors, the recipe cursor, then 2 relation
+        # queries for each chunk
+        with self.assertNumQueries(7):
+            content = b''.join(res.streaming_content)
+
+        self.assertEqual(res['Content-Type'], 'application/gzip')
+        self.assertIn('recipes.jsonl.gz', res['Content-Disposition'])
+        lines = gzip.decompress(content).splitlines()
+        self.assertEqual(len(lines), 3)
+
 
 class ImageUploadTests(TestCase):
     """ Test for recipe image upload API """
@@ -541,8 +1487,24 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for key in self.recipe.image_variants:
+            self.recipe.image.storage.delete(
+                variant_name(self.recipe.image.name, key)
+            )
         self.recipe.image.delete()
 
+    def upload_image(self, size=(10, 10)):
+        """ Upload an image to the recipe and return the response """
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', size).save(image_file, format='JPEG')
+            image_file.seek(0)
+            return self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': image_file},
+                format='multipart',
+            )
+
     def test_upload_image(self):
         """ Test upload an image to a recipe """
         url = image_upload_url(self.recipe.id)
@@ -563,6 +1525,83 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_image_not_writable_through_recipe_update(self):
+        """ Test recipe updates ignore images, set by uploads only """
+        self.upload_image(size=(10, 10))
+        recipe = Recipe.objects.get(id=self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (12, 12)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.patch(
+                detail_url(self.recipe.id),
+                {'title': 'New title', 'image': image_file},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'New title')
+        self.assertEqual(self.recipe.image.name, recipe.image.name)
+        self.assertEqual(self.recipe.image_variants, recipe.image_variants)
+        self.assertEqual(ImageBlob.objects.get().references, 1)
+
+    def test_identical_uploads_stored_once(self):
+        """ Test identical images are stored once under their hash """
+        content = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(content, format='JPEG')
+        other = create_recipe(user=self.user)
+
+        for recipe in (self.recipe, other):
+            res = self.client.post(
+                image_upload_url(recipe.id),
+                {'image': SimpleUploadedFile('a.jpg', content.getvalue())},
+                format='multipart',
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        digest = hashlib.sha256(content.getvalue()).hexdigest()
+        self.assertEqual(
+            self.recipe.image.name,
+            f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{digest}.jpg',
+        )
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.digest, digest)
+        self.assertEqual(blob.references, 2)
+
+    def test_replaced_and_deleted_images_released(self):
+        """ Test replacing or deleting recipe images drops references """
+        self.upload_image(size=(10, 10))
+        first = Recipe.objects.get(id=self.recipe.id).image.name
+        self.upload_image(size=(12, 12))
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        for key in self.recipe.image_variants:
+            storage.delete(variant_name(first, key))
+        storage.delete(first)
+
+        self.assertEqual(ImageBlob.objects.get(name=first).references, 0)
+        self.assertEqual(
+            ImageBlob.objects.get(name=self.recipe.image.name).references,
+            1,
+        )
+
+        other = create_recipe(user=self.user)
+        Recipe.objects.filter(id=other.id).update(image=self.recipe.image)
+        ImageBlob.objects.filter(name=self.recipe.image.name).update(
+            references=2,
+        )
+        other.refresh_from_db()
+        other.delete()
+
+        self.assertEqual(
+            ImageBlob.objects.get(name=self.recipe.image.name).references,
+            1,
+        )
+
     def test_upload_image_bad_request(self):
         """ Test upload invalid image """
         url = image_upload_url(self.recipe.id)
@@ -573,3 +1612,226 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        RECIPE_IMAGE_VARIANT_SIZES=[16, 64],
+        RECIPE_IMAGE_VARIANT_FORMATS=['webp', 'jpeg'],
+    )
+    def test_upload_image_generates_variants(self):
+        """ Test uploading an image writes resized variants """
+        res = self.upload_image(size=(100, 50))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data['image_variants']), {'16', '64'})
+        self.assertEqual(
+            set(res.data['image_variants']['16']),
+            {'webp', 'jpeg'},
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            sorted(self.recipe.image_variants),
+            ['16.jpeg', '16.webp', '64.jpeg', '64.webp'],
+        )
+        storage = self.recipe.image.storage
+        with storage.open(variant_name(self.recipe.image.name, '16.webp')) \
+                as file, Image.open(file) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (16, 8))
+        with storage.open(variant_name(self.recipe.image.name, '64.jpeg')) \
+                as file, Image.open(file) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (64, 32))
+
+    @override_settings(
+        RECIPE_IMAGE_VARIANT_SIZES=[16],
+        RECIPE_IMAGE_VARIANT_FORMATS=['jpeg'],
+    )
+    def test_missing_variants_not_generated_on_read(self):
+        """ Test reads return recorded variants only and never write """
+        self.upload_image(size=(40, 40))
+        other = create_recipe(user=self.user, image='uploads/recipe/x.jpg')
+
+        with override_settings(
+            RECIPE_IMAGE_VARIANT_SIZES=[16, 32],
+        ), CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(self.recipe.id))
+            list_res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(set(res.data['image_variants']), {'16'})
+        variants = {
+            item['id']: item['image_variants'] for item in list_res.data
+        }
+        self.assertEqual(set(variants[self.recipe.id]), {'16'})
+        self.assertEqual(variants[other.id], {})
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if not query['sql'].startswith('SELECT')
+        ])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, ['16.jpeg'])
+        self.assertFalse(self.recipe.image.storage.exists(
+            variant_name(self.recipe.image.name, '32.jpeg')
+        ))
+
+    def test_recipe_without_image_has_no_variants(self):
+        """ Test image variants are null for recipes without image """
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertIsNone(res.data['image_variants'])
+
+
+class AsyncImageUploadTests(TestCase):
+    """ Test image uploads processed by the image workers """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com',
+            password='12345678',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.spool_dir = tempfile.mkdtemp()
+        settings_override = override_settings(
+            RECIPE_IMAGE_PROCESSING='async',
+            RECIPE_IMAGE_SPOOL_DIR=self.spool_dir,
+            RECIPE_IMAGE_VARIANT_SIZES=[16],
+            RECIPE_IMAGE_VARIANT_FORMATS=['jpeg'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir)
+        for recipe in Recipe.objects.exclude(image=None):
+            for key in recipe.image_variants:
+                recipe.image.storage.delete(
+                    variant_name(recipe.image.name, key)
+                )
+            recipe.image.delete()
+
+    def upload_image(self, content):
+        """ Upload image bytes to the recipe and return the response """
+        image_file = io.BytesIO(content)
+        image_file.name = 'upload.jpg'
+        return self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': image_file},
+            format='multipart',
+        )
+
+    def process_images(self):
+        """ Run the image workers in process until the queue is empty """
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'process_images',
+                workers=0,
+                once=True,
+                stdout=io.StringIO(),
+            )
+
+    def jpeg_bytes(self, size=(40, 20), orientation=None):
+        """ Return a JPEG image with an optional EXIF orientation """
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        Image.new('RGB', size).save(buffer, format='JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def test_upload_image_accepted(self):
+        """ Test uploads are spooled and queued with 202 Accepted """
+        res = self.upload_image(self.jpeg_bytes())
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], 'processing')
+        self.assertIsNone(res.data['image'])
+        job = ImageJob.objects.get(recipe=self.recipe)
+        self.assertTrue(job.upload.startswith(self.spool_dir))
+        self.assertTrue(os.path.exists(job.upload))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'processing')
+
+    def test_process_images_updates_recipe(self):
+        """ Test workers re-encode the upload without EXIF and variants """
+        self.upload_image(self.jpeg_bytes(size=(40, 20), orientation=6))
+        upload = ImageJob.objects.get(recipe=self.recipe).upload
+
+        self.process_images()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertEqual(self.recipe.image_variants, ['16.jpeg'])
+        with self.recipe.image.open() as file, Image.open(file) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertNotIn('exif', image.info)
+        self.assertTrue(self.recipe.image.storage.exists(
+            variant_name(self.recipe.image.name, '16.jpeg')
+        ))
+        self.assertFalse(ImageJob.objects.exists())
+        self.assertFalse(os.path.exists(upload))
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['image_status'], 'ready')
+        self.assertIn('16', res.data['image_variants'])
+
+    def test_process_images_invalid_upload(self):
+        """ Test invalid uploads mark the recipe image as failed """
+        res = self.upload_image(b'notanimage')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+        self.process_images()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'failed')
+        self.assertFalse(self.recipe.image)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_superseded_upload_not_applied(self):
+        """ Test only the last upload of a recipe is applied """
+        superseded = self.jpeg_bytes(size=(30, 30))
+        self.upload_image(superseded)
+        self.upload_image(self.jpeg_bytes(size=(50, 30)))
+
+        self.process_images()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertEqual(self.recipe.image.width, 50)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.name, self.recipe.image.name)
+        self.assertEqual(blob.references, 1)
+
+        # Unreferenced images are left to garbage collection
+        name = recipe_image_content_path(
+            hashlib.sha256(superseded).hexdigest(),
+            '.jpeg',
+        )
+        storage = self.recipe.image.storage
+        self.assertTrue(storage.exists(name))
+        storage.delete(variant_name(name, '16.jpeg'))
+        storage.delete(name)
+
+    def test_stored_upload_not_reencoded(self):
+        """ Test uploads of already stored bytes reuse the stored image """
+        content = self.jpeg_bytes()
+        other = create_recipe(user=self.user)
+        self.upload_image(content)
+        self.process_images()
+
+        with patch('recipe.processing.encode_upload') as encode_upload:
+            self.client.post(
+                image_upload_url(other.id),
+                {'image': SimpleUploadedFile('copy.jpg', content)},
+                format='multipart',
+            )
+            self.process_images()
+
+        encode_upload.assert_not_called()
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertEqual(other.image_variants, ['16.jpeg'])
+        self.assertEqual(ImageBlob.objects.get().references, 2)
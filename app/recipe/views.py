@@ -1,6 +1,7 @@
 """
 Views for recipe APIs
 """
+from urllib.parse import quote
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -11,16 +12,93 @@ from rest_framework import (
     viewsets,
     status,
 )
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import action
+from rest_framework.decorators import (
+    action,
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.response import Response
-from core.models import Recipe
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import patch_cache_control
+from django.utils.translation import gettext as _
+from django.db.models import (
+    BigIntegerField,
+    Prefetch,
+    Exists,
+    OuterRef,
+    Count,
+    F,
+)
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+)
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RECIPE_SEARCH_CONFIG,
+)
 from recipe.serializers import (
     RecipeSerializer,
+    RecipeListSerializer,
     RecipeDetailSerializer,
     RecipeImageSerializer,
+    RecipeImageUploadSerializer,
+    RecipeBulkDeleteSerializer,
 )
+from recipe.export import export_records
+from recipe.media import (
+    MEDIA_MAX_AGE,
+    is_safe_name,
+    media_content_type,
+    owns_image,
+)
+from recipe.pagination import RecipeCursorPagination
+from common.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from common.renderers import (
+    BATCH_RENDERER_CLASSES,
+    CSVRenderer,
+    JSONLinesRenderer,
+)
+from common.streaming import (
+    buffered,
+    chunked,
+    gzipped,
+)
+from common.views.cache import CachedResponseMixin
+from common.views.conditional import ConditionalGetMixin
+
+FIELD_SELECTION_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return, all by default',
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description=(
+            'Comma separated list of relations (tags, ingredients) returned '
+            'as objects instead of IDs when `fields` is given'
+        ),
+    ),
+]
 
 
 @extend_schema_view(
@@ -36,43 +114,232 @@ from recipe.serializers import (
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description=(
+                    'Return recipes having any (default) or all of the '
+                    'listed tags/ingredients'
+                ),
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description=(
+                    'Full-text search over title and description, '
+                    'results are ordered by relevance'
+                ),
+            ),
+            *FIELD_SELECTION_PARAMETERS,
         ],
+        responses=RecipeSerializer(many=True),
     ),
+    retrieve=extend_schema(parameters=FIELD_SELECTION_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet,
+):
     """ View for manage recipe API """
     serializer_class = RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        SignedTokenAuthentication,
+        CachedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES,
+        *BATCH_RENDERER_CLASSES,
+    ]
 
     def _params_to_ints(self, qs):
         """ Convert a list of strings to integers """
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _filter_by_related(self, queryset, through, field, ids, match_all):
+        """
+        Filter recipes linked to the given ids through an M2M table.
+
+        Uses semi-joins on the through table so recipes are never
+        duplicated and no DISTINCT is needed.
+        """
+        ids = set(ids)
+        links = through.objects.filter(**{f'{field}__in': ids})
+
+        if match_all:
+            recipe_ids = links.values('recipe_id').annotate(
+                matched=Count(field),
+            ).filter(matched=len(ids)).values('recipe_id')
+            return queryset.filter(id__in=recipe_ids)
+
+        return queryset.filter(
+            Exists(links.filter(recipe_id=OuterRef('pk')))
+        )
+
+    def _prefetch_related(self, queryset, fields=None, expand=()):
+        """
+        Prefetch tags and ingredients of recipes, only the selected ones
+        and only their ids when not expanded
+        """
+        lookups = []
+        for name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            if fields is not None and name not in fields:
+                continue
+            columns = ['id']
+            if fields is None or name in expand:
+                columns.append('name')
+            lookups.append(Prefetch(
+                name,
+                queryset=model.objects.only(*columns).order_by('id'),
+            ))
+
+        return queryset.prefetch_related(*lookups)
+
+    def _parse_names(self, param, allowed):
+        """ Return the comma separated names of a query parameter """
+        value = self.request.query_params.get(param, '')
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names - set(allowed)
+        if unknown:
+            msg = _('Unknown fields: %(names)s') % {
+                'names': ', '.join(sorted(unknown)),
+            }
+            raise ValidationError({param: [msg]})
+
+        return names
+
+    def get_field_selection(self):
+        """
+        Return the fields selected with `?fields=`, None for all, and the
+        relations expanded with `?expand=` for list and retrieve
+        """
+        if (
+            self.action not in ('list', 'retrieve') or
+            not self.request.query_params.get('fields')
+        ):
+            return None, set(RecipeSerializer.related_fields)
+
+        serializer_class = RecipeDetailSerializer
+        if self.action == 'list':
+            serializer_class = RecipeSerializer
+
+        return (
+            self._parse_names('fields', serializer_class.Meta.fields),
+            self._parse_names('expand', RecipeSerializer.related_fields),
+        )
+
+    def _get_search(self):
+        """ Return the full-text search term of the request """
+        return self.request.query_params.get('search', '').strip()
+
+    def get_ordering(self):
+        """ Order search results by relevance, others by newest first """
+        if self.action == 'list' and self._get_search():
+            return ('-rank', '-id')
+
+        return ('-id',)
+
     def get_queryset(self):
         """ Retrieve recipes for authenticated user """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match_all = self.request.query_params.get('match') == 'all'
+        search = self._get_search()
+        fields, expand = self.get_field_selection()
 
-        queryset = self.queryset
+        queryset = self.queryset.defer('search_vector')
+        columns = None
+        if fields is not None:
+            columns = RecipeSerializer.get_columns(fields)
+        # Rows are merged with relations and paginated by id
+        list_columns = [
+            column for column in RecipeListSerializer.columns
+            if columns is None or column in columns
+        ]
+        if self.action == 'list' and search:
+            query = SearchQuery(
+                search,
+                config=RECIPE_SEARCH_CONFIG,
+                search_type='websearch',
+            )
+            # Cursors hold the rank as text, so it is scaled to an integer
+            # which round trips exactly instead of a float
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(
+                    SearchRank(F('search_vector'), query) * 1000000,
+                    BigIntegerField(),
+                ),
+            )
+            list_columns.append('rank')
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_by_related(
+                queryset,
+                Recipe.tags.through,
+                'tag_id',
+                self._params_to_ints(tags),
+                match_all,
+            )
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = self._filter_by_related(
+                queryset,
+                Recipe.ingredients.through,
+                'ingredient_id',
+                self._params_to_ints(ingredients),
+                match_all,
+            )
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by(*self.get_ordering())
+
+        if self.action == 'list':
+            return queryset.values(*list_columns)
+
+        if columns is not None:
+            queryset = queryset.only(*columns)
+
+        return self._prefetch_related(queryset, fields, expand)
+
+    def get_validator_querysets(self):
+        """ Return rows whose changes alter recipe responses """
+        user = self.request.user
+        if self.action == 'retrieve':
+            recipe_id = self.kwargs['pk']
+            return [
+                Recipe.objects.filter(user=user, id=recipe_id),
+                Tag.objects.filter(recipe=recipe_id),
+                Ingredient.objects.filter(recipe=recipe_id),
+            ]
+
+        return [
+            Recipe.objects.filter(user=user),
+            Tag.objects.filter(user=user),
+            Ingredient.objects.filter(user=user),
+        ]
+
+    def get_serializer_context(self):
+        """ Add the selected fields and relations to expand """
+        context = super().get_serializer_context()
+        fields, expand = self.get_field_selection()
+        if fields is not None:
+            context.update(fields=fields, expand=expand)
+
+        return context
 
     def get_serializer_class(self):
         """ Return serializer class for request """
         if self.action == 'list':
-            return RecipeSerializer
+            return RecipeListSerializer
         elif self.action == 'upload_image':
+            if settings.RECIPE_IMAGE_PROCESSING == 'async':
+                return RecipeImageUploadSerializer
             return RecipeImageSerializer
+        elif self.action == 'bulk_destroy':
+            return RecipeBulkDeleteSerializer
 
         return self.serializer_class
 
@@ -80,14 +347,256 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """ Create a new recipe """
         return serializer.save(user=self.request.user)
 
+    def _stream_rows(self, queryset):
+        """
+        Serialize recipes in chunks read from a server-side cursor, with
+        one query per relation and chunk
+        """
+        chunk_size = settings.RECIPE_STREAM_CHUNK_SIZE
+        context = self.get_serializer_context()
+        rows = queryset.iterator(chunk_size=chunk_size)
+        for chunk in chunked(rows, chunk_size):
+            yield from RecipeListSerializer(
+                chunk,
+                many=True,
+                context=context,
+            ).data
+
+    def list(self, request, *args, **kwargs):
+        """ List recipes, streaming every matching recipe as CSV """
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, CSVRenderer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self._stream_rows(queryset)
+        header = RecipeListSerializer(
+            context=self.get_serializer_context(),
+        ).get_output_fields()
+
+        return StreamingHttpResponse(
+            renderer.stream(rows, header=header),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'compress',
+                OpenApiTypes.STR,
+                enum=['gzip'],
+                description='Compress the export on the fly',
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='export',
+        renderer_classes=[JSONLinesRenderer],
+        pagination_class=None,
+    )
+    def export(self, request):
+        """
+        Stream every tag, ingredient and recipe of the user as JSON Lines
+        """
+        renderer = request.accepted_renderer
+        records = export_records(
+            request.user,
+            settings.RECIPE_STREAM_CHUNK_SIZE,
+        )
+        content = buffered(renderer.stream(records))
+        content_type = renderer.media_type
+        filename = 'recipes.jsonl'
+        if request.query_params.get('compress') == 'gzip':
+            content = gzipped(content)
+            content_type = 'application/gzip'
+            filename += '.gz'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """ Upload an image to recipe """
+        """
+        Upload an image to recipe, processed by the image workers with 202
+        Accepted in the `async` image processing mode
+        """
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
             serializer.save()
+            if isinstance(serializer, RecipeImageUploadSerializer):
+                return Response(serializer.data, status.HTTP_202_ACCEPTED)
             return Response(serializer.data, status.HTTP_200_OK)
 
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    def _get_bulk_items(self, request):
+        """ Return the items of a bulk request, enforcing the batch size """
+        items = request.data
+        if not isinstance(items, list):
+            msg = _('Expected a list of items')
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [msg]})
+
+        max_size = settings.RECIPE_BULK_MAX_SIZE
+        if len(items) > max_size:
+            msg = _('Ensure there are no more than %(max)d items') % {
+                'max': max_size,
+            }
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [msg]})
+
+        return items
+
+    def _bulk_response(self, recipe_ids, status_code):
+        """ Return recipes in the given order with their relations """
+        recipes = self._prefetch_related(
+            Recipe.objects.filter(id__in=recipe_ids)
+        ).in_bulk()
+        serializer = RecipeDetailSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+
+        return Response(serializer.data, status_code)
+
+    @extend_schema(
+        request=RecipeDetailSerializer(many=True),
+        responses=RecipeDetailSerializer(many=True),
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='bulk',
+        pagination_class=None,
+    )
+    def bulk_create(self, request):
+        """ Create many recipes in one transaction """
+        items = self._get_bulk_items(request)
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(user=request.user)
+
+        return self._bulk_response(
+            [recipe.id for recipe in recipes],
+            status.HTTP_201_CREATED,
+        )
+
+    @extend_schema(
+        request=RecipeDetailSerializer(many=True, partial=True),
+        responses=RecipeDetailSerializer(many=True),
+    )
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        """ Partially update many recipes by id in one transaction """
+        items = self._get_bulk_items(request)
+        item_ids = [
+            item.get('id') if isinstance(item, dict) else None
+            for item in items
+        ]
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=[
+                item_id for item_id in item_ids
+                if isinstance(item_id, int) and not isinstance(item_id, bool)
+            ],
+        ).in_bulk()
+
+        errors = []
+        seen_ids = set()
+        for item_id in item_ids:
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                errors.append({'id': [_('A valid integer is required')]})
+                continue
+            if item_id not in recipes:
+                errors.append({'id': [_('Recipe not found')]})
+            elif item_id in seen_ids:
+                errors.append({'id': [_('Duplicated recipe id')]})
+            else:
+                errors.append({})
+            seen_ids.add(item_id)
+        if any(errors):
+            raise ValidationError(errors)
+
+        serializer = self.get_serializer(
+            [recipes[item_id] for item_id in item_ids],
+            data=items,
+            many=True,
+            partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return self._bulk_response(item_ids, status.HTTP_200_OK)
+
+    @extend_schema(
+        request=RecipeBulkDeleteSerializer,
+        responses=OpenApiTypes.OBJECT,
+    )
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        """ Delete many recipes by id in one transaction """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        item_ids = serializer.validated_data['ids']
+        recipe_ids = list(dict.fromkeys(item_ids))
+
+        with transaction.atomic():
+            recipes = Recipe.objects.filter(
+                user=request.user,
+                id__in=recipe_ids,
+            )
+            found_ids = set(
+                recipes.select_for_update().values_list('id', flat=True)
+            )
+            missing = {
+                index: [_('Recipe not found')]
+                for index, recipe_id in enumerate(item_ids)
+                if recipe_id not in found_ids
+            }
+            if missing:
+                raise ValidationError({'ids': missing})
+
+            recipes.delete()
+
+        return Response(
+            [{'id': recipe_id, 'deleted': True} for recipe_id in recipe_ids],
+            status.HTTP_200_OK,
+        )
+
+
+@extend_schema(responses={(200, '*/*'): OpenApiTypes.BINARY})
+@api_view(['GET'])
+@authentication_classes([SignedTokenAuthentication, CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def recipe_media(request, name):
+    """
+    Send an image, or image variant, of a recipe of the user. The transfer
+    is handed to nginx with X-Accel-Redirect, so no file bytes pass
+    through Django.
+    """
+    if not is_safe_name(name) or not owns_image(request.user, name):
+        raise Http404
+
+    content_type = media_content_type(name)
+    prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix + quote(name)
+    else:
+        storage = Recipe._meta.get_field('image').storage
+        try:
+            response = FileResponse(
+                storage.open(name),
+                content_type=content_type,
+            )
+        except FileNotFoundError:
+            raise Http404
+    patch_cache_control(response, private=True, max_age=MEDIA_MAX_AGE)
+
+    return response
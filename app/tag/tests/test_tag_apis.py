@@ -2,7 +2,11 @@
 Tests for tag APIs
 """
 from decimal import Decimal
-from django.test import TestCase
+from unittest.mock import patch
+from django.test import (
+    TestCase,
+    override_settings,
+)
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
@@ -15,6 +19,7 @@ from core.models import (
 from tag.serializers import TagSerializer
 
 TAGS_URL = reverse('tag:tag-list')
+TAGS_AUTOCOMPLETE_URL = reverse('tag:tag-autocomplete')
 
 
 def detail_url(tag_id):
@@ -46,6 +51,7 @@ class PublicTagApisTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+@override_settings(RESPONSE_CACHE_ENABLED=True)
 class PrivateTagApisTests(TestCase):
     """ Test for authenticated tag APIs """
 
@@ -168,3 +174,103 @@ class PrivateTagApisTests(TestCase):
         res = self.client.get(TAGS_URL, params)
 
         self.assertEqual(len(res.data), 1)
+
+    def test_update_tag_duplicated_name_error(self):
+        """ Test rename a tag to an existing name returns error """
+        Tag.objects.create(name="Tag 1", user=self.user)
+        tag = Tag.objects.create(name="Tag 2", user=self.user)
+
+        url = detail_url(tag.id)
+        res = self.client.patch(url, {'name': 'Tag 1'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Tag 2')
+
+    def test_autocomplete_tags(self):
+        """ Test suggest tags by prefix first, ranked by usage """
+        tag_1 = Tag.objects.create(name='Dinner', user=self.user)
+        tag_2 = Tag.objects.create(name='Dim sum', user=self.user)
+        tag_3 = Tag.objects.create(name='Quick dinner', user=self.user)
+        Tag.objects.create(name='Breakfast', user=self.user)
+        other_user = create_user(email='other@example.com')
+        Tag.objects.create(name='Dinner party', user=other_user)
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Recipe 1',
+            time_minutes=20,
+            price=Decimal('5.25'),
+        )
+        recipe.tags.add(tag_2)
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'di'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [tag_2.id, tag_1.id, tag_3.id],
+        )
+
+    def test_autocomplete_tags_typo(self):
+        """ Test suggest tags similar to a misspelled term, closest first """
+        tag_1 = Tag.objects.create(name='Vegetarian', user=self.user)
+        tag_2 = Tag.objects.create(name='Vegetarian dinner', user=self.user)
+        Tag.objects.create(name='Breakfast', user=self.user)
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Recipe 1',
+            time_minutes=20,
+            price=Decimal('5.25'),
+        )
+        recipe.tags.add(tag_2)
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'vegitarian'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [tag_1.id, tag_2.id],
+        )
+
+    def test_autocomplete_tags_limit(self):
+        """ Test autocomplete returns at most the requested number """
+        for i in range(5):
+            Tag.objects.create(name=f'Tag {i}', user=self.user)
+
+        params = {'q': 'tag', 'limit': 2}
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_autocomplete_tags_requires_term(self):
+        """ Test autocomplete without a term returns error """
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_tags_not_modified(self):
+        """ Test unchanged tag list returns 304 """
+        tag = Tag.objects.create(name='Tag 1', user=self.user)
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(detail_url(tag.id), {'name': 'Tag 2'})
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_expired_tag_list_served_stale_while_rebuilt(self):
+        """ Test expired tag list is served while another request locks """
+        Tag.objects.create(name='Tag 1', user=self.user)
+        res = self.client.get(TAGS_URL)
+
+        with patch('common.cache.acquire_lock', return_value=False):
+            stale = self.client.get(TAGS_URL)
+
+        self.assertEqual(stale['X-Cache'], 'STALE')
+        self.assertEqual(stale.content, res.content)
@@ -65,3 +65,9 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class AccessTokenSerializer(serializers.Serializer):
+    """ Serializer for signed access token """
+    access = serializers.CharField()
+    expires_in = serializers.IntegerField()
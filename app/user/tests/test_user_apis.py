@@ -1,14 +1,17 @@
 """
 Tests for user APIs
 """
+from django.conf import settings
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
+TOKEN_REFRESH_URL = reverse('user:token-refresh')
 ME_URL = reverse('user:me')
 
 
@@ -83,6 +86,11 @@ class PublicUserApisTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('token', res.data)
+        self.assertIn('access', res.data)
+        self.assertEqual(
+            res.data['expires_in'],
+            settings.ACCESS_TOKEN_LIFETIME,
+        )
 
     def test_create_token_bad_request(self):
         """ Test create token with invalid credentials """
@@ -162,3 +170,41 @@ class PrivateUserApisTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+    def test_retrieve_profile_with_access_token(self):
+        """ Test signed access token from login authenticates """
+        create_user(email='other@example.com', password='12345678')
+        payload = {'email': 'other@example.com', 'password': '12345678'}
+        access = self.client.post(TOKEN_URL, payload).data['access']
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        res = client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], 'other@example.com')
+
+    def test_refresh_access_token(self):
+        """ Test auth token is traded for a new access token """
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.post(TOKEN_REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {res.data["access"]}')
+        res = client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_refresh_access_token_requires_auth_token(self):
+        """ Test access tokens cannot refresh themselves """
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        access = client.post(TOKEN_REFRESH_URL).data['access']
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        res = client.post(TOKEN_REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -19,6 +19,11 @@ urlpatterns = [
         views.CreateTokenView.as_view(),
         name='token'
     ),
+    path(
+        API_ENDPOINTS['user']['token-refresh'],
+        views.RefreshAccessTokenView.as_view(),
+        name='token-refresh'
+    ),
     path(
         API_ENDPOINTS['user']['me'],
         views.ManageUserView.as_view(),
@@ -1,20 +1,60 @@
 """
 Views for user API
 """
-from rest_framework import generics, authentication, permissions
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from common.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+    create_access_token,
+)
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
+    AccessTokenSerializer,
 )
 
 
+def access_token_data(user):
+    """ Return a new signed access token of a user and its lifetime """
+    return {
+        'access': create_access_token(user),
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
 class CreateTokenView(ObtainAuthToken):
-    """ Create a new auth token for user """
+    """ Create a new auth token and a signed access token for user """
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """ Return the auth token and a signed access token of user """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, _ = Token.objects.get_or_create(user=user)
+
+        return Response({'token': token.key, **access_token_data(user)})
+
+
+class RefreshAccessTokenView(APIView):
+    """ Trade an auth token for a new signed access token """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(request=None, responses=AccessTokenSerializer)
+    def post(self, request):
+        """ Return a new signed access token of authenticated user """
+        return Response(access_token_data(request.user))
+
 
 class CreateUserView(generics.CreateAPIView):
     """ Create a new user in the system """
@@ -24,9 +64,17 @@ class CreateUserView(generics.CreateAPIView):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """ Manage authenticated user """
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [
+        SignedTokenAuthentication,
+        CachedTokenAuthentication,
+    ]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         """ Retrieve and return authenticated user """
-        return self.request.user
+        user = self.request.user
+        if user.get_deferred_fields():
+            # Signed access tokens authenticate without loading the user
+            user = get_user_model().objects.get(id=user.id)
+
+        return user
@@ -1,8 +1,15 @@
 server {
     listen ${LISTEN_PORT};
 
-    location /static {
-        alias /vol/static;
+    location /static/static {
+        alias /vol/static/static;
+    }
+
+    # Media is only sent after the app authorized the request, through
+    # `X-Accel-Redirect: /protected-media/<name>` responses
+    location /protected-media/ {
+        internal;
+        alias /vol/static/media/;
     }
 
     location / {